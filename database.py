@@ -1,27 +1,300 @@
+import collections
+import contextlib
+import datetime
 import os
+import random
+import threading
 import time
 import psycopg2
+import psycopg2.extensions
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+# Соединение, пролежавшее в пуле дольше этого времени, закрывается и открывается заново
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get("DB_POOL_MAX_IDLE_SECONDS", "300"))
+# Перед выдачей соединения, простоявшего дольше этого времени, проверяем его через SELECT 1
+DB_POOL_HEALTHCHECK_AFTER_SECONDS = float(os.environ.get("DB_POOL_HEALTHCHECK_AFTER_SECONDS", "30"))
+DB_POOL_CHECKOUT_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_CHECKOUT_TIMEOUT_SECONDS", "30"))
+
+DB_CONNECT_TIMEOUT_SECONDS = int(os.environ.get("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+# После стольких неудачных подключений подряд перестаем ходить в базу на DB_CIRCUIT_RESET_SECONDS
+DB_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("DB_CIRCUIT_FAILURE_THRESHOLD", "3"))
+DB_CIRCUIT_RESET_SECONDS = float(os.environ.get("DB_CIRCUIT_RESET_SECONDS", "15"))
+DB_STARTUP_CONNECT_ATTEMPTS = int(os.environ.get("DB_STARTUP_CONNECT_ATTEMPTS", "8"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+class ConnectionLost(DatabaseUnavailable):
+    # Соединение оборвалось посреди транзакции. Коммит мог успеть дойти до сервера,
+    # поэтому такой запрос повторять нельзя — пользователю просто отвечаем «попробуй позже»
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_progress:
+                raise DatabaseUnavailable("База данных недоступна, повторная попытка позже")
+            # Полуоткрытое состояние: пропускаем одну пробную попытку, остальные пока отбиваем
+            self._trial_in_progress = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+circuit_breaker = CircuitBreaker(DB_CIRCUIT_FAILURE_THRESHOLD, DB_CIRCUIT_RESET_SECONDS)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0) -> float:
+    # Экспоненциальная задержка с полным джиттером, чтобы процессы не ломились в базу одновременно
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
 
 def get_connection():
     if not DATABASE_URL:
         raise ValueError("❌ Не задан DATABASE_URL в переменных окружения")
-    last_error = None
-    for attempt in range(5):
+    circuit_breaker.before_call()
+    try:
+        conn = psycopg2.connect(DATABASE_URL, connect_timeout=DB_CONNECT_TIMEOUT_SECONDS)
+    except psycopg2.OperationalError as exc:
+        circuit_breaker.record_failure()
+        raise DatabaseUnavailable(f"Не удалось подключиться к базе данных: {exc}") from exc
+    circuit_breaker.record_success()
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, min_size: int, max_size: int, max_idle_seconds: float, healthcheck_after_seconds: float):
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.max_idle_seconds = max_idle_seconds
+        self.healthcheck_after_seconds = healthcheck_after_seconds
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+
+    def warm_up(self):
+        connections = []
         try:
-            return psycopg2.connect(DATABASE_URL)
-        except psycopg2.OperationalError as exc:
-            last_error = exc
-            if attempt == 4:
-                raise
-            time.sleep(2)
-    raise last_error
+            for _ in range(self.min_size):
+                connections.append(self.getconn())
+        finally:
+            for conn in connections:
+                self.putconn(conn)
+
+    def getconn(self, timeout: float = None):
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"Не удалось получить соединение из пула за {timeout} сек.")
+        try:
+            while True:
+                with self._lock:
+                    # LIFO: чаще всего отдаем самое «горячее» соединение, старые остаются в начале очереди
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return get_connection()
+
+                conn, last_used = item
+                idle_for = time.monotonic() - last_used
+                if conn.closed or idle_for > self.max_idle_seconds:
+                    self._close(conn)
+                    continue
+                if idle_for > self.healthcheck_after_seconds and not self._is_alive(conn):
+                    self._close(conn)
+                    continue
+                return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard: bool = False):
+        try:
+            if not discard and not conn.closed:
+                try:
+                    if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+            if discard or conn.closed:
+                self._close(conn)
+                return
+
+            now = time.monotonic()
+            stale = []
+            with self._lock:
+                self._idle.append((conn, now))
+                # Лишние простаивающие соединения сверх min_size закрываем
+                while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle_seconds:
+                    stale.append(self._idle.popleft()[0])
+            for stale_conn in stale:
+                self._close(stale_conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            connections = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in connections:
+            self._close(conn)
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_idle_seconds=DB_POOL_MAX_IDLE_SECONDS,
+                    healthcheck_after_seconds=DB_POOL_HEALTHCHECK_AFTER_SECONDS,
+                )
+                pool.warm_up()
+                _pool = pool
+    return _pool
+
+
+@contextlib.contextmanager
+def connection():
+    pool = get_pool()
+    conn = pool.getconn(timeout=DB_POOL_CHECKOUT_TIMEOUT_SECONDS)
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as exc:
+        discard = True
+        # Соединение оборвалось прямо во время запроса — считаем это сбоем базы
+        if conn.closed:
+            circuit_breaker.record_failure()
+            raise ConnectionLost(f"Соединение с базой данных потеряно: {exc}") from exc
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+# Произвольный ключ advisory-lock, чтобы два процесса бота не применяли миграции одновременно
+SCHEMA_MIGRATIONS_LOCK_ID = 731_001
+
 
 def init_db():
-    conn = get_connection()
+    # На старте база может подниматься вместе с ботом, поэтому ждем ее с нарастающей задержкой
+    for attempt in range(DB_STARTUP_CONNECT_ATTEMPTS):
+        try:
+            with connection() as conn:
+                _run_migrations(conn)
+            return
+        except DatabaseUnavailable:
+            if attempt == DB_STARTUP_CONNECT_ATTEMPTS - 1:
+                raise
+            time.sleep(max(backoff_delay(attempt, base=1.0), DB_CIRCUIT_RESET_SECONDS if circuit_breaker.is_open() else 0))
+
+
+def _run_migrations(conn):
     cursor = conn.cursor()
-    
+    latest_version = MIGRATIONS[-1][0]
+
+    # Обычный перезапуск: одна проверка версии без DDL
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        if cursor.fetchone()[0] >= latest_version:
+            conn.commit()
+            cursor.close()
+            return
+
+    cursor.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_MIGRATIONS_LOCK_ID,))
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+
+        # Каждая миграция применяется в своей транзакции вместе с записью о ней
+        for version, name, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            migrate(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if not conn.closed:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_MIGRATIONS_LOCK_ID,))
+            conn.commit()
+        cursor.close()
+
+
+def _migration_base_schema(cursor):
+    # Исходная схема; IF NOT EXISTS оставлены, чтобы миграция прошла и на базе, созданной до учета версий
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
         user_id BIGINT PRIMARY KEY,
@@ -75,14 +348,6 @@ def init_db():
     )
     """)
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS late_players (
-        user_id BIGINT,
-        game_id INTEGER,
-        PRIMARY KEY(user_id, game_id)
-    )
-    """)
-
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS settings (
         key TEXT PRIMARY KEY,
@@ -90,7 +355,281 @@ def init_db():
     )
     """)
     cursor.execute("INSERT INTO settings (key, value) VALUES ('schedule', 'Расписание пока не установлено') ON CONFLICT (key) DO NOTHING")
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+
+
+def _create_seat_counters(cursor):
+    # Денормализованные счетчики мест по игре. Их поддерживают триггеры на registrations
+    # и thinking_players, поэтому любые пути записи (запись, отмена, опоздание, «думаю»)
+    # обновляют их в той же транзакции, а проверка вместимости читает одну строку.
+    cursor.execute("SELECT to_regclass('game_seat_counters') IS NULL")
+    needs_backfill = cursor.fetchone()[0]
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS game_seat_counters (
+        game_id INTEGER PRIMARY KEY,
+        registered INTEGER NOT NULL DEFAULT 0,
+        late_registered INTEGER NOT NULL DEFAULT 0,
+        thinking INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION sync_registration_seat_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE game_seat_counters
+            SET registered = registered - 1,
+                late_registered = late_registered - (OLD.status = 'registered' AND OLD.is_late IS TRUE)::int
+            WHERE game_id = OLD.game_id AND OLD.status = 'registered';
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'registered' THEN
+            INSERT INTO game_seat_counters (game_id, registered, late_registered)
+            VALUES (NEW.game_id, 1, (NEW.is_late IS TRUE)::int)
+            ON CONFLICT (game_id) DO UPDATE SET
+                registered = game_seat_counters.registered + 1,
+                late_registered = game_seat_counters.late_registered + EXCLUDED.late_registered;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+
+    cursor.execute("""
+    CREATE OR REPLACE FUNCTION sync_thinking_seat_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE game_seat_counters SET thinking = thinking - 1 WHERE game_id = OLD.game_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO game_seat_counters (game_id, thinking)
+            VALUES (NEW.game_id, 1)
+            ON CONFLICT (game_id) DO UPDATE SET thinking = game_seat_counters.thinking + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+
+    cursor.execute("DROP TRIGGER IF EXISTS registrations_seat_counters ON registrations")
+    cursor.execute("""
+    CREATE TRIGGER registrations_seat_counters
+    AFTER INSERT OR UPDATE OR DELETE ON registrations
+    FOR EACH ROW EXECUTE FUNCTION sync_registration_seat_counters()
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS thinking_players_seat_counters ON thinking_players")
+    cursor.execute("""
+    CREATE TRIGGER thinking_players_seat_counters
+    AFTER INSERT OR UPDATE OR DELETE ON thinking_players
+    FOR EACH ROW EXECUTE FUNCTION sync_thinking_seat_counters()
+    """)
+
+    if needs_backfill:
+        cursor.execute("""
+        INSERT INTO game_seat_counters (game_id, registered, late_registered, thinking)
+        SELECT g.game_id,
+               COALESCE(r.registered, 0),
+               COALESCE(r.late_registered, 0),
+               COALESCE(t.thinking, 0)
+        FROM games g
+        LEFT JOIN (
+            SELECT game_id,
+                   COUNT(*) AS registered,
+                   COUNT(*) FILTER (WHERE is_late) AS late_registered
+            FROM registrations
+            WHERE status = 'registered'
+            GROUP BY game_id
+        ) r ON r.game_id = g.game_id
+        LEFT JOIN (
+            SELECT game_id, COUNT(*) AS thinking
+            FROM thinking_players
+            GROUP BY game_id
+        ) t ON t.game_id = g.game_id
+        ON CONFLICT (game_id) DO NOTHING
+        """)
+
+
+def _fold_legacy_late_players(cursor):
+    # Одноразовая миграция: отметки опоздания из старой таблицы late_players переносятся
+    # в registrations.is_late, после чего таблица удаляется и флаг хранится в одном месте.
+    cursor.execute("SELECT to_regclass('late_players') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return
+
+    cursor.execute("""
+    UPDATE registrations r
+    SET is_late = TRUE
+    FROM late_players lp
+    WHERE lp.user_id = r.user_id
+      AND lp.game_id = r.game_id
+      AND r.status = 'registered'
+      AND r.is_late IS NOT TRUE
+    """)
+    cursor.execute("DROP TABLE late_players")
+
+
+def parse_game_date(game_date: str, assume_current_year: bool = True):
+    if not game_date:
+        return None
+
+    normalized = game_date.strip()
+    parts = normalized.split()
+    if len(parts) >= 2 and parts[0] in ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']:
+        normalized = parts[1]
+
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%d.%m.%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%d.%m"):
+        try:
+            parsed = datetime.datetime.strptime(normalized, fmt).date()
+            if fmt == "%d.%m":
+                if not assume_current_year:
+                    return None
+                return parsed.replace(year=datetime.date.today().year)
+            return parsed
+        except ValueError:
+            continue
+    return None
+
+
+def _migration_game_dates(cursor):
+    # game_date хранит подпись для кнопок, game_on — настоящую дату для фильтрации и сортировки
+    cursor.execute("ALTER TABLE games ADD COLUMN IF NOT EXISTS game_on DATE")
+    cursor.execute("SELECT game_id, game_date FROM games WHERE game_on IS NULL")
+    # Год для подписей вида «12.05» неизвестен: год запуска миграции для старых игр был бы выдумкой.
+    # Такие игры оставляем с NULL — они остаются в списке предстоящих, как и до миграции
+    parsed = [
+        (game_id, parse_game_date(game_date, assume_current_year=False))
+        for game_id, game_date in cursor.fetchall()
+    ]
+    parsed = [(game_id, game_on) for game_id, game_on in parsed if game_on]
+    if parsed:
+        cursor.execute(
+            """
+            UPDATE games g
+            SET game_on = p.game_on
+            FROM unnest(%s::INTEGER[], %s::DATE[]) AS p(game_id, game_on)
+            WHERE g.game_id = p.game_id
+            """,
+            ([game_id for game_id, _ in parsed], [game_on for _, game_on in parsed])
+        )
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS games_game_on_idx
+    ON games (game_on) WHERE is_deleted = FALSE
+    """)
+
+
+def _migration_game_indexes(cursor):
+    # Первичные ключи начинаются с user_id, а горячие запросы фильтруют по game_id (и status)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS registrations_game_status_idx
+    ON registrations (game_id, status) INCLUDE (user_id, is_late)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS thinking_players_game_user_idx
+    ON thinking_players (game_id, user_id)
+    """)
+
+
+def _migration_manual_player_id_seq(cursor):
+    # Игроков, добавленных админом вручную, нумеруем последовательностью, продолжая текущий максимум
+    cursor.execute("CREATE SEQUENCE IF NOT EXISTS manual_player_id_seq AS BIGINT")
+    cursor.execute("""
+    SELECT setval('manual_player_id_seq', COALESCE(MAX(ABS(platform_user_id)), 0) + 1, false)
+    FROM users
+    WHERE platform = 'telegram' AND platform_user_id IS NOT NULL
+    """)
+
+
+def _migration_outbox(cursor):
+    # Очередь исходящих сообщений: рассылка сначала целиком записывается сюда, затем ее разбирает воркер.
+    # Одна строка на получателя в рамках кампании, поэтому повторная постановка не дублирует отправку.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS outbox_campaigns (
+        campaign_id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        requested_by BIGINT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        completed_at TIMESTAMPTZ
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS outbox (
+        outbox_id BIGSERIAL PRIMARY KEY,
+        campaign_id TEXT NOT NULL REFERENCES outbox_campaigns (campaign_id) ON DELETE CASCADE,
+        user_id BIGINT NOT NULL,
+        text TEXT NOT NULL,
+        parse_mode TEXT,
+        reply_markup TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        sent_at TIMESTAMPTZ,
+        UNIQUE (campaign_id, user_id)
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS outbox_pending_idx
+    ON outbox (outbox_id) WHERE status = 'pending'
+    """)
+
+
+def _migration_outbox_retries(cursor):
+    # Временные ошибки (flood control, сеть) откладывают повтор до next_attempt_at
+    cursor.execute("ALTER TABLE outbox ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ")
+
+
+def _migration_unreachable_users(cursor):
+    # Отмечаем пользователей, до которых сообщения не доходят (бот заблокирован, чат не найден)
+    cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS unreachable_since TIMESTAMPTZ")
+    cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS unreachable_reason TEXT")
+
+
+def _migration_user_last_seen(cursor):
+    # Время последнего обращения к боту, с точностью до часа; нужно, чтобы будить только активных
+    cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ")
+
+
+def _migration_registration_order(cursor):
+    # Порядок в списке участников — по времени записи. Старым строкам проставляем время
+    # в их текущем физическом порядке, чтобы списки после миграции не перемешались
+    cursor.execute("ALTER TABLE registrations ADD COLUMN IF NOT EXISTS registered_at TIMESTAMPTZ")
+    cursor.execute("""
+    UPDATE registrations r
+    SET registered_at = NOW() - make_interval(secs => o.position)
+    FROM (
+        SELECT ctid AS row_ctid, ROW_NUMBER() OVER (ORDER BY ctid DESC) AS position
+        FROM registrations
+    ) o
+    WHERE r.ctid = o.row_ctid AND r.registered_at IS NULL
+    """)
+    cursor.execute("ALTER TABLE registrations ALTER COLUMN registered_at SET DEFAULT NOW()")
+    cursor.execute("ALTER TABLE registrations ALTER COLUMN registered_at SET NOT NULL")
+
+
+
+def _migration_orphaned_game_rows(cursor):
+    # Отмена игры раньше удаляла только записи и саму игру — подчищаем оставшиеся после нее строки
+    cursor.execute("""
+    DELETE FROM thinking_players t
+    WHERE NOT EXISTS (SELECT 1 FROM games g WHERE g.game_id = t.game_id)
+    """)
+    cursor.execute("""
+    DELETE FROM game_seat_counters c
+    WHERE NOT EXISTS (SELECT 1 FROM games g WHERE g.game_id = c.game_id)
+    """)
+
+
+# Номера миграций не меняются и не переиспользуются, новые добавляются только в конец
+MIGRATIONS = [
+    (1, "base_schema", _migration_base_schema),
+    (2, "game_seat_counters", _create_seat_counters),
+    (3, "fold_late_players", _fold_legacy_late_players),
+    (4, "game_dates", _migration_game_dates),
+    (5, "game_indexes", _migration_game_indexes),
+    (6, "manual_player_id_seq", _migration_manual_player_id_seq),
+    (7, "outbox", _migration_outbox),
+    (8, "outbox_retries", _migration_outbox_retries),
+    (9, "unreachable_users", _migration_unreachable_users),
+    (10, "user_last_seen", _migration_user_last_seen),
+    (11, "registration_order", _migration_registration_order),
+    (12, "orphaned_game_rows", _migration_orphaned_game_rows),
+]
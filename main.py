@@ -7,10 +7,16 @@ import threading
 import time
 import uuid
 import calendar
+import random
+import collections
+import contextvars
 import database
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.filters import Command, ExceptionTypeFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.storage.redis import RedisStorage
@@ -20,6 +26,8 @@ from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
 from aiogram_calendar.schemas import SimpleCalAct
 import datetime
+from typing import NamedTuple
+import aiohttp
 import vk_api
 from vk_api.bot_longpoll import VkBotLongPoll, VkBotEventType
 from vk_api.keyboard import VkKeyboard, VkKeyboardColor
@@ -37,6 +45,10 @@ VK_TOKEN_ENV = os.environ.get("VK_TOKEN")
 VK_TOKEN = VK_BOT_TOKEN_ENV or VK_TOKEN_ENV
 VK_GROUP_ID = os.environ.get("VK_GROUP_ID")
 DISABLE_TELEGRAM_POLLING = os.environ.get("DISABLE_TELEGRAM_POLLING", "").strip().lower() in {"1", "true", "yes", "on"}
+WAKE_UP_ON_START = os.environ.get("WAKE_UP_ON_START", "").strip().lower() in {"1", "true", "yes", "on"}
+# 0 — будить всех, иначе только тех, кто писал боту за последние N дней. Пользователей,
+# у которых last_seen_at еще не записан (все, кто не писал с момента миграции 10), тоже будим
+WAKE_UP_ACTIVE_DAYS = int(os.environ.get("WAKE_UP_ACTIVE_DAYS", "0"))
 ADMIN_ID = 2127578673
 SECOND_ADMIN_ID = 703800719
 ADMIN_IDS = {ADMIN_ID, SECOND_ADMIN_ID}
@@ -48,6 +60,16 @@ VK_MAX_BUTTONS_ON_LINE = 5
 VK_MAX_LINES = 10
 VK_REMINDER_USERS_PAGE_SIZE = 8
 VK_LONGPOLL_RECONNECT_DELAY_SECONDS = 5
+VK_API_URL = "https://api.vk.com/method/"
+# Long poll живет на версии по умолчанию из vk_api; для отправки нужна версия, где
+# messages.send с peer_ids отвечает по каждому получателю
+VK_API_VERSION = os.environ.get("VK_API_VERSION", "5.131")
+VK_API_TIMEOUT_SECONDS = float(os.environ.get("VK_API_TIMEOUT_SECONDS", "10"))
+VK_API_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("VK_API_CONNECT_TIMEOUT_SECONDS", "3"))
+VK_API_MAX_CONNECTIONS = int(os.environ.get("VK_API_MAX_CONNECTIONS", "20"))
+# Лимиты VK: messages.send принимает до 100 peer_ids, execute — до 25 вызовов
+VK_PEERS_PER_SEND = 100
+VK_CALLS_PER_EXECUTE = 25
 ADMIN_PARTICIPANTS_FORMAT_NAME = "name_only"
 ADMIN_PARTICIPANTS_FORMAT_NAME_NICK = "name_nick"
 ADMIN_PARTICIPANTS_FORMAT_FULL = "name_nick_link"
@@ -57,6 +79,25 @@ ADMIN_PARTICIPANTS_FORMAT_LABELS = {
     ADMIN_PARTICIPANTS_FORMAT_FULL: "• имя фамилия ник и ссылка на профиль",
 }
 
+# Аудитории рассылок и напоминаний по игре. Планы этих запросов проверяет tests/test_query_plans.py.
+# Рассылка берет только записавшихся, напоминание «записавшимся» — всех, у кого есть запись на игру
+REGISTERED_AUDIENCE_QUERY = "SELECT user_id FROM registrations WHERE game_id = %s AND status = 'registered'"
+NOT_REGISTERED_AUDIENCE_QUERY = """
+    SELECT u.user_id FROM users u
+    WHERE u.unreachable_since IS NULL AND NOT EXISTS (
+        SELECT 1 FROM registrations r
+        WHERE r.game_id = %s AND r.status = 'registered' AND r.user_id = u.user_id
+    )
+"""
+REMINDER_REGISTERED_AUDIENCE_QUERY = "SELECT user_id FROM registrations WHERE game_id = %s"
+REMINDER_NOT_REGISTERED_AUDIENCE_QUERY = """
+    SELECT u.user_id FROM users u
+    WHERE u.unreachable_since IS NULL AND NOT EXISTS (
+        SELECT 1 FROM registrations r WHERE r.game_id = %s AND r.user_id = u.user_id
+    )
+"""
+THINKING_AUDIENCE_QUERY = "SELECT user_id FROM thinking_players WHERE game_id = %s"
+
 # Проверка наличия токена
 if not API_TOKEN:
     raise ValueError("❌ Не задан токен бота. Укажи TELEGRAM_BOT_TOKEN (или BOT_TOKEN / TELEGRAM_TOKEN)")
@@ -65,11 +106,82 @@ if not API_TOKEN:
 bot = Bot(token=API_TOKEN)
 redis = None
 vk_session = None
-vk_api_client = None
 vk_longpoll = None
 vk_states = {}
 
 
+class AsyncVkApi:
+    """Вызовы VK API через общую aiohttp-сессию, не блокируя event loop."""
+
+    def __init__(self, token: str, api_version: str = VK_API_VERSION):
+        self.token = token
+        self.api_version = api_version
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессию создаем лениво: ей нужен запущенный event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(
+                    total=VK_API_TIMEOUT_SECONDS,
+                    sock_connect=VK_API_CONNECT_TIMEOUT_SECONDS,
+                ),
+                connector=aiohttp.TCPConnector(limit=VK_API_MAX_CONNECTIONS, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def _request(self, method: str, **values):
+        params = {key: value for key, value in values.items() if value is not None}
+        params["access_token"] = self.token
+        params["v"] = self.api_version
+        async with self._get_session().post(VK_API_URL + method, data=params) as response:
+            response.raise_for_status()
+            payload = await response.json(content_type=None)
+        if "error" in payload:
+            # Тот же тип ошибки, что и у vk_api, чтобы classify_send_error работал без изменений
+            raise vk_api.exceptions.ApiError(None, method, values, payload, payload["error"])
+        return payload
+
+    async def method(self, method: str, **values):
+        return (await self._request(method, **values)).get("response")
+
+    async def execute(self, calls):
+        """Выполняет список вызовов (method, params) одним запросом execute.
+
+        Параметры передаются через Args, чтобы не экранировать тексты внутри VKScript.
+        Возвращает результаты по порядку; на месте неудавшегося вызова — ApiError.
+        """
+        args = {}
+        statements = []
+        for index, (method, params) in enumerate(calls):
+            fields = []
+            for key, value in params.items():
+                if value is None:
+                    continue
+                arg_name = f"c{index}_{key}"
+                args[arg_name] = value
+                fields.append(f'"{key}": Args.{arg_name}')
+            statements.append(f"API.{method}({{{', '.join(fields)}}})")
+        payload = await self._request("execute", code=f"return [{', '.join(statements)}];", **args)
+
+        # Неудавшийся вызов возвращает false, а описание ошибки попадает в execute_errors по порядку
+        errors = iter(payload.get("execute_errors") or [])
+        results = []
+        for (method, params), result in zip(calls, payload.get("response") or []):
+            if result is False:
+                error = next(errors, None) or {"error_code": 0, "error_msg": "execute: вызов не выполнен"}
+                result = vk_api.exceptions.ApiError(None, method, params, payload, error)
+            results.append(result)
+        return results
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+vk_async_api = AsyncVkApi(VK_TOKEN) if VK_TOKEN else None
+
+
 def mask_secret(secret: str) -> str:
     if not secret:
         return "missing"
@@ -97,22 +209,51 @@ dp = Dispatcher(storage=storage)
 database.init_db()
 
 def execute_query(query, params=(), fetch=False, fetchone=False):
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(query, params)
-        if fetch:
-            return cursor.fetchall()
-        if fetchone:
-            return cursor.fetchone()
-        conn.commit()
-    except Exception as e:
-        logging.error(f"Database error: {e}")
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            result = None
+            if fetch:
+                result = cursor.fetchall()
+            elif fetchone:
+                result = cursor.fetchone()
+            conn.commit()
+            return result
+        except Exception as e:
+            logging.error(f"Database error: {e}")
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+
+
+# Пул потоков ограничен размером пула соединений: синхронный psycopg2 работает в нем,
+# а event loop только ждет результат и продолжает обрабатывать остальные апдейты
+db_executor = ThreadPoolExecutor(max_workers=database.DB_POOL_MAX_SIZE, thread_name_prefix="db")
+
+
+DB_QUERY_CONNECT_ATTEMPTS = int(os.environ.get("DB_QUERY_CONNECT_ATTEMPTS", "3"))
+
+
+async def run_db_call(func, *args, **kwargs):
+    # Повторяем только неудачное подключение: запрос тогда еще не выполнялся. ConnectionLost
+    # (обрыв посреди транзакции, возможно уже после коммита) не повторяем, чтобы запись не применилась
+    # дважды. Пока circuit breaker открыт, ошибка уходит сразу.
+    loop = asyncio.get_running_loop()
+    for attempt in range(DB_QUERY_CONNECT_ATTEMPTS):
+        try:
+            return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+        except database.ConnectionLost:
+            raise
+        except database.DatabaseUnavailable:
+            if attempt == DB_QUERY_CONNECT_ATTEMPTS - 1 or database.circuit_breaker.is_open():
+                raise
+            await asyncio.sleep(database.backoff_delay(attempt, base=0.2, cap=2.0))
+
+
+async def execute_query_async(query, params=(), fetch=False, fetchone=False):
+    return await run_db_call(execute_query, query, params, fetch=fetch, fetchone=fetchone)
 
 
 def make_internal_user_id(platform: str, platform_user_id: int) -> int:
@@ -134,17 +275,99 @@ def telegram_internal_user_id(user: types.User) -> int:
     return make_internal_user_id(PLATFORM_TELEGRAM, user.id)
 
 
-def get_user_record(user_id: int):
-    return execute_query(
+USER_PROFILE_CACHE_SIZE = int(os.environ.get("USER_PROFILE_CACHE_SIZE", "5000"))
+USER_PROFILE_CACHE_TTL_SECONDS = float(os.environ.get("USER_PROFILE_CACHE_TTL_SECONDS", "600"))
+
+# LRU-кэш профилей: internal user_id -> (время загрузки, строка users или None).
+# upsert_user обновляет запись сразу после сохранения, поэтому кэш не отстает от своих же изменений.
+user_profile_cache = collections.OrderedDict()
+user_profile_cache_stats = {"hits": 0, "misses": 0}
+# Растет при каждом изменении профиля в обход get_user_record: строку, прочитанную из базы
+# до такого изменения, в кэш не кладем, чтобы не затереть более свежую запись
+user_profile_cache_state = {"generation": 0}
+
+
+def store_user_profile(user_id: int, user_row):
+    user_profile_cache[user_id] = (time.monotonic(), tuple(user_row) if user_row else None)
+    user_profile_cache.move_to_end(user_id)
+    while len(user_profile_cache) > USER_PROFILE_CACHE_SIZE:
+        user_profile_cache.popitem(last=False)
+
+
+def remember_user_profile(user_id: int, user_row):
+    user_profile_cache_state["generation"] += 1
+    store_user_profile(user_id, user_row)
+
+
+def forget_user_profile(user_id: int):
+    user_profile_cache_state["generation"] += 1
+    user_profile_cache.pop(user_id, None)
+
+
+def get_user_profile_cache_stats() -> dict:
+    return {**user_profile_cache_stats, "size": len(user_profile_cache)}
+
+
+async def get_user_record(user_id: int):
+    """Строка пользователя: user_id, platform, platform_user_id, first_name, last_name,
+    mafia_nick, telegram_username, vk_username, age, unreachable_since."""
+    cached = user_profile_cache.get(user_id)
+    if cached and time.monotonic() - cached[0] < USER_PROFILE_CACHE_TTL_SECONDS:
+        user_profile_cache_stats["hits"] += 1
+        user_profile_cache.move_to_end(user_id)
+        return cached[1]
+
+    user_profile_cache_stats["misses"] += 1
+    generation = user_profile_cache_state["generation"]
+    user_row = await execute_query_async(
         """
         SELECT user_id, platform, platform_user_id, first_name, last_name, mafia_nick,
-               telegram_username, vk_username
+               telegram_username, vk_username, age, unreachable_since
         FROM users
         WHERE user_id = %s
         """,
         (user_id,),
         fetchone=True
     )
+    if user_profile_cache_state["generation"] == generation:
+        store_user_profile(user_id, user_row)
+    return tuple(user_row) if user_row else None
+
+
+async def mark_user_reachable(user_id: int):
+    # Пользователь снова написал боту — значит, сообщения до него доходят
+    user_row = await get_user_record(user_id)
+    if user_row and user_row[9] is not None:
+        await execute_query_async(
+            "UPDATE users SET unreachable_since = NULL, unreachable_reason = NULL WHERE user_id = %s",
+            (user_id,)
+        )
+        remember_user_profile(user_id, (*user_row[:9], None))
+
+
+USER_ACTIVITY_TOUCH_SECONDS = 3600
+user_activity_touched_at = {}
+
+
+async def touch_user_activity(user_id: int):
+    # last_seen_at нужен с точностью до часа, поэтому пишем в базу не чаще раза в час на пользователя
+    now = time.monotonic()
+    touched_at = user_activity_touched_at.get(user_id)
+    if touched_at is not None and now - touched_at < USER_ACTIVITY_TOUCH_SECONDS:
+        return
+    user_activity_touched_at[user_id] = now
+    if len(user_activity_touched_at) > 10000:
+        for touched_user_id, touched_at in list(user_activity_touched_at.items()):
+            if now - touched_at >= USER_ACTIVITY_TOUCH_SECONDS:
+                del user_activity_touched_at[touched_user_id]
+    await execute_query_async("UPDATE users SET last_seen_at = NOW() WHERE user_id = %s", (user_id,))
+
+
+async def get_user_names(user_id: int):
+    user_row = await get_user_record(user_id)
+    if not user_row:
+        return None
+    return user_row[3], user_row[4], user_row[5]
 
 
 def get_display_username(user_row) -> str:
@@ -175,7 +398,7 @@ def build_profile_link(platform: str, platform_user_id: int, telegram_username:
     return f"https://vk.com/id{platform_user_id}"
 
 
-def upsert_user(
+async def upsert_user(
     platform: str,
     platform_user_id: int,
     first_name: str,
@@ -186,22 +409,31 @@ def upsert_user(
     vk_username: str = None,
 ):
     internal_user_id = make_internal_user_id(platform, platform_user_id)
-    execute_query(
+    # Вместе с сохранением профиля получаем игры, в списках которых он выводится
+    affected_games = await execute_query_async(
         """
-        INSERT INTO users (
-            user_id, platform, platform_user_id, first_name, last_name,
-            mafia_nick, age, telegram_username, vk_username
+        WITH saved AS (
+            INSERT INTO users (
+                user_id, platform, platform_user_id, first_name, last_name,
+                mafia_nick, age, telegram_username, vk_username
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT(user_id) DO UPDATE SET
+                platform = EXCLUDED.platform,
+                platform_user_id = EXCLUDED.platform_user_id,
+                first_name = EXCLUDED.first_name,
+                last_name = EXCLUDED.last_name,
+                mafia_nick = EXCLUDED.mafia_nick,
+                age = EXCLUDED.age,
+                telegram_username = EXCLUDED.telegram_username,
+                vk_username = EXCLUDED.vk_username,
+                unreachable_since = NULL,
+                unreachable_reason = NULL
+            RETURNING user_id
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT(user_id) DO UPDATE SET
-            platform = EXCLUDED.platform,
-            platform_user_id = EXCLUDED.platform_user_id,
-            first_name = EXCLUDED.first_name,
-            last_name = EXCLUDED.last_name,
-            mafia_nick = EXCLUDED.mafia_nick,
-            age = EXCLUDED.age,
-            telegram_username = EXCLUDED.telegram_username,
-            vk_username = EXCLUDED.vk_username
+        SELECT r.game_id FROM registrations r JOIN saved s ON s.user_id = r.user_id
+        UNION
+        SELECT t.game_id FROM thinking_players t JOIN saved s ON s.user_id = t.user_id
         """,
         (
             internal_user_id,
@@ -214,7 +446,25 @@ def upsert_user(
             telegram_username,
             vk_username,
         ),
+        fetch=True,
+    )
+    remember_user_profile(
+        internal_user_id,
+        (
+            internal_user_id,
+            platform,
+            int(platform_user_id),
+            first_name,
+            last_name,
+            mafia_nick,
+            telegram_username,
+            vk_username,
+            age,
+            None,
+        )
     )
+    for (game_id,) in affected_games:
+        invalidate_participants_cache(game_id)
     return internal_user_id
 
 
@@ -231,11 +481,12 @@ async def send_text_to_user(user_id: int, text: str, parse_mode: str = None, rep
         )
         return
 
-    if not vk_api_client:
+    if not vk_async_api:
         logging.warning("VK API client не инициализирован, сообщение не отправлено пользователю %s", user_id)
         return
 
-    vk_api_client.messages.send(
+    await vk_async_api.method(
+        "messages.send",
         user_id=platform_user_id,
         random_id=uuid.uuid4().int & 0x7FFFFFFF,
         message=text,
@@ -243,9 +494,589 @@ async def send_text_to_user(user_id: int, text: str, parse_mode: str = None, rep
     )
 
 
+TELEGRAM_BROADCAST_RATE_PER_SECOND = float(os.environ.get("TELEGRAM_BROADCAST_RATE_PER_SECOND", "28"))
+TELEGRAM_PER_CHAT_INTERVAL_SECONDS = float(os.environ.get("TELEGRAM_PER_CHAT_INTERVAL_SECONDS", "1"))
+VK_BROADCAST_RATE_PER_SECOND = float(os.environ.get("VK_BROADCAST_RATE_PER_SECOND", "15"))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_PROGRESS_INTERVAL_SECONDS = float(os.environ.get("BROADCAST_PROGRESS_INTERVAL_SECONDS", "5"))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        # Flood control от платформы: до этого момента не отправляем ничего
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Общие бюджеты на все рассылки процесса: у Telegram и VK лимиты независимые
+telegram_send_bucket = TokenBucket(TELEGRAM_BROADCAST_RATE_PER_SECOND)
+vk_send_bucket = TokenBucket(VK_BROADCAST_RATE_PER_SECOND)
+chat_next_send_at = {}
+
+
+async def wait_send_slot(user_id: int):
+    if detect_platform_by_user_id(user_id) != PLATFORM_TELEGRAM:
+        await vk_send_bucket.acquire()
+        return
+
+    now = time.monotonic()
+    send_at = max(now, chat_next_send_at.get(user_id, 0.0))
+    chat_next_send_at[user_id] = send_at + TELEGRAM_PER_CHAT_INTERVAL_SECONDS
+    if len(chat_next_send_at) > 10000:
+        for chat_id, next_at in list(chat_next_send_at.items()):
+            if next_at < now:
+                del chat_next_send_at[chat_id]
+    if send_at > now:
+        await asyncio.sleep(send_at - now)
+    await telegram_send_bucket.acquire()
+
+
+async def run_broadcast(jobs, send_one, job_user_id):
+    """Отправляет задания с ограничением скорости несколькими параллельными отправщиками.
+
+    job_user_id(job) возвращает получателя, send_one(job) отправляет одно сообщение
+    и сам обрабатывает ошибки отправки.
+    """
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def sender():
+        while not queue.empty():
+            job = queue.get_nowait()
+            await wait_send_slot(job_user_id(job))
+            await send_one(job)
+
+    await asyncio.gather(*(sender() for _ in range(min(BROADCAST_CONCURRENCY, queue.qsize()))))
+
+
+def telegram_progress_reporter(chat_id: int, title: str):
+    progress_message = {}
+
+    async def report(done: int, total: int):
+        text = f"{title}: отправлено {done} из {total}…"
+        if "message_id" not in progress_message:
+            sent = await bot.send_message(chat_id, text)
+            progress_message["message_id"] = sent.message_id
+        else:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=progress_message["message_id"])
+
+    return report
+
+
+def vk_progress_reporter(vk_user_id: int, title: str):
+    async def report(done: int, total: int):
+        await send_vk_message(vk_user_id, f"{title}: отправлено {done} из {total}…")
+
+    return report
+
+
+def progress_reporter(user_id: int, title: str):
+    if detect_platform_by_user_id(user_id) == PLATFORM_TELEGRAM:
+        return telegram_progress_reporter(get_platform_user_id(user_id), title)
+    return vk_progress_reporter(get_platform_user_id(user_id), title)
+
+
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.environ.get("OUTBOX_POLL_INTERVAL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", "10"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.environ.get("OUTBOX_RETRY_MAX_SECONDS", "900"))
+
+# Коды ошибок VK API: 6 и 9 — слишком частые запросы/flood control, 10 — внутренняя ошибка VK
+VK_TRANSIENT_ERROR_CODES = {6, 9, 10}
+# 7 — нет прав, 900 — пользователь в черном списке, 901/902 — нет разрешения писать пользователю
+VK_PERMANENT_ERROR_CODES = {7, 900, 901, 902}
+VK_UNREACHABLE_ERROR_CODES = {900, 901, 902}
+
+
+class OutboxMessage(NamedTuple):
+    user_id: int
+    text: str
+    parse_mode: str = None
+    reply_markup: object = None
+
+
+# Рассылки идут через таблицу outbox: кампания целиком сохраняется в базе, а воркер
+# отправляет ее пачками и отмечает статус каждого получателя, поэтому после перезапуска
+# отправка продолжается с того же места. Доставка «хотя бы один раз»: если процесс упадет
+# между отправкой и отметкой, это сообщение уйдет повторно.
+outbox_wakeup = asyncio.Event()
+outbox_progress = {}
+
+
+def serialize_reply_markup(reply_markup):
+    # Клавиатуры VK уже строка JSON, inline-клавиатуры Telegram сериализуем через pydantic
+    if reply_markup is None or isinstance(reply_markup, str):
+        return reply_markup
+    return reply_markup.model_dump_json(exclude_none=True)
+
+
+def deserialize_reply_markup(user_id: int, reply_markup):
+    if reply_markup is None or detect_platform_by_user_id(user_id) != PLATFORM_TELEGRAM:
+        return reply_markup
+    return types.InlineKeyboardMarkup.model_validate_json(reply_markup)
+
+
+async def enqueue_campaign(
+    title: str,
+    messages,
+    requested_by: int = None,
+    include_unreachable: bool = False,
+    campaign_id: str = None,
+) -> int:
+    messages = [OutboxMessage(*message) for message in messages]
+    if not messages:
+        return 0
+
+    # campaign_id, построенный из исходного апдейта, делает постановку идемпотентной: повторно
+    # доставленный апдейт попадает в ON CONFLICT, и рассылка не ставится в очередь второй раз
+    campaign_id = campaign_id or uuid.uuid4().hex
+    row = await execute_query_async(
+        """
+        WITH messages AS (
+            SELECT m.user_id, m.text, m.parse_mode, m.reply_markup
+            FROM unnest(%s::BIGINT[], %s::TEXT[], %s::TEXT[], %s::TEXT[]) AS m(user_id, text, parse_mode, reply_markup)
+            WHERE %s OR NOT EXISTS (
+                SELECT 1 FROM users u WHERE u.user_id = m.user_id AND u.unreachable_since IS NOT NULL
+            )
+        ), campaign AS (
+            -- Кампанию без получателей не создаем: без строк outbox она никогда не завершится
+            INSERT INTO outbox_campaigns (campaign_id, title, requested_by)
+            SELECT %s, %s, %s
+            WHERE EXISTS (SELECT 1 FROM messages)
+            ON CONFLICT (campaign_id) DO NOTHING
+            RETURNING campaign_id
+        ), queued AS (
+            INSERT INTO outbox (campaign_id, user_id, text, parse_mode, reply_markup)
+            SELECT c.campaign_id, m.user_id, m.text, m.parse_mode, m.reply_markup
+            FROM messages m CROSS JOIN campaign c
+            ON CONFLICT (campaign_id, user_id) DO NOTHING
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM queued
+        """,
+        (
+            [message.user_id for message in messages],
+            [message.text for message in messages],
+            [message.parse_mode for message in messages],
+            [serialize_reply_markup(message.reply_markup) for message in messages],
+            include_unreachable,
+            campaign_id,
+            title,
+            requested_by,
+        ),
+        fetchone=True
+    )
+    if row[0]:
+        outbox_wakeup.set()
+    return row[0]
+
+
+vk_current_message_id = contextvars.ContextVar("vk_current_message_id", default=None)
+
+
+def telegram_campaign_id(event) -> str:
+    if isinstance(event, types.CallbackQuery):
+        return f"tg:callback:{event.id}"
+    return f"tg:{event.chat.id}:{event.message_id}"
+
+
+def vk_campaign_id(vk_user_id: int):
+    message_id = vk_current_message_id.get()
+    return f"vk:{vk_user_id}:{message_id}" if message_id else None
+
+
+class SendFailure(NamedTuple):
+    permanent: bool
+    retry_after: float = None
+    # Пользователь заблокировал бота или закрыл сообщения — в массовые рассылки больше не берем
+    unreachable: bool = False
+
+
+def classify_send_error(exc: Exception) -> SendFailure:
+    if isinstance(exc, TelegramRetryAfter):
+        return SendFailure(permanent=False, retry_after=float(exc.retry_after))
+    if isinstance(exc, TelegramForbiddenError):
+        return SendFailure(permanent=True, unreachable=True)
+    if isinstance(exc, TelegramBadRequest):
+        # chat not found, неверная разметка и т.п. — повтор не поможет
+        return SendFailure(permanent=True, unreachable="chat not found" in str(exc).lower())
+    if isinstance(exc, vk_api.exceptions.ApiError):
+        if exc.code in VK_PERMANENT_ERROR_CODES:
+            return SendFailure(permanent=True, unreachable=exc.code in VK_UNREACHABLE_ERROR_CODES)
+        if exc.code in VK_TRANSIENT_ERROR_CODES:
+            return SendFailure(permanent=False, retry_after=1.0 if exc.code in {6, 9} else None)
+        return SendFailure(permanent=True)
+    # Сетевые ошибки и 5xx считаем временными
+    return SendFailure(permanent=False)
+
+
+def outbox_retry_delay(attempts: int, retry_after: float = None) -> float:
+    if retry_after:
+        return retry_after
+    delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def claim_outbox_batch():
+    rows = await execute_query_async(
+        """
+        UPDATE outbox
+        SET status = 'sending', attempts = attempts + 1
+        WHERE outbox_id IN (
+            SELECT outbox_id
+            FROM outbox
+            WHERE status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= NOW())
+            ORDER BY outbox_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING outbox_id, campaign_id, user_id, text, parse_mode, reply_markup, attempts
+        """,
+        (OUTBOX_BATCH_SIZE,),
+        fetch=True
+    )
+    return sorted(rows)
+
+
+def vk_send_error(item) -> Exception:
+    error = (item or {}).get("error") or {"code": 0, "description": "нет ответа для получателя"}
+    return vk_api.exceptions.ApiError(
+        None,
+        "messages.send",
+        {},
+        item,
+        {"error_code": error.get("code"), "error_msg": error.get("description")}
+    )
+
+
+async def deliver_vk_outbox_jobs(jobs, on_sent, on_failure):
+    """Отправляет VK-часть пачки outbox пакетно.
+
+    Одинаковые сообщения одной кампании уходят одним messages.send на VK_PEERS_PER_SEND
+    получателей, а до VK_CALLS_PER_EXECUTE таких вызовов объединяются в один execute.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job[1], job[3], job[5]), []).append(job)
+
+    sends = []
+    for (_, text, reply_markup), group_jobs in groups.items():
+        for start in range(0, len(group_jobs), VK_PEERS_PER_SEND):
+            sends.append((text, reply_markup, group_jobs[start:start + VK_PEERS_PER_SEND]))
+
+    for start in range(0, len(sends), VK_CALLS_PER_EXECUTE):
+        chunk = sends[start:start + VK_CALLS_PER_EXECUTE]
+        calls = [
+            (
+                "messages.send",
+                {
+                    "peer_ids": ",".join(str(get_platform_user_id(job[2])) for job in send_jobs),
+                    "random_id": uuid.uuid4().int & 0x7FFFFFFF,
+                    "message": text,
+                    "keyboard": reply_markup,
+                },
+            )
+            for text, reply_markup, send_jobs in chunk
+        ]
+        await vk_send_bucket.acquire()
+        try:
+            results = await vk_async_api.execute(calls)
+        except Exception as e:
+            for _, _, send_jobs in chunk:
+                for job in send_jobs:
+                    on_failure(job, e)
+            continue
+
+        for index, (_, _, send_jobs) in enumerate(chunk):
+            result = results[index] if index < len(results) else None
+            if isinstance(result, Exception):
+                for job in send_jobs:
+                    on_failure(job, result)
+                continue
+            # С peer_ids VK отвечает списком {peer_id, message_id} или {peer_id, error} на каждого получателя
+            by_peer = {item.get("peer_id"): item for item in result or [] if isinstance(item, dict)}
+            for job in send_jobs:
+                item = by_peer.get(get_platform_user_id(job[2]))
+                if item is None or "error" in item:
+                    on_failure(job, vk_send_error(item))
+                else:
+                    on_sent(job)
+
+
+async def deliver_outbox_batch(batch):
+    sent_ids = []
+    failed = []
+    retries = []
+    unreachable = {}
+
+    def record_sent(job):
+        sent_ids.append(job[0])
+
+    def record_failure(job, e):
+        outbox_id, _, user_id, _, _, _, attempts = job
+        failure = classify_send_error(e)
+        if failure.retry_after and detect_platform_by_user_id(user_id) == PLATFORM_TELEGRAM:
+            telegram_send_bucket.pause(failure.retry_after)
+        elif failure.retry_after:
+            vk_send_bucket.pause(failure.retry_after)
+
+        if failure.permanent or attempts >= OUTBOX_MAX_ATTEMPTS:
+            logging.error(f"Рассылка: не удалось отправить сообщение пользователю {user_id}: {e}")
+            failed.append((outbox_id, str(e)))
+            if failure.unreachable:
+                unreachable[user_id] = str(e)
+        else:
+            logging.warning(f"Рассылка: повторим отправку пользователю {user_id} (попытка {attempts}): {e}")
+            retries.append((outbox_id, str(e), outbox_retry_delay(attempts, failure.retry_after)))
+
+    async def deliver(job):
+        _, _, user_id, text, parse_mode, reply_markup, _ = job
+        try:
+            await send_text_to_user(
+                user_id,
+                text,
+                parse_mode=parse_mode,
+                reply_markup=deserialize_reply_markup(user_id, reply_markup)
+            )
+        except Exception as e:
+            record_failure(job, e)
+            return
+        record_sent(job)
+
+    if vk_async_api:
+        single_jobs = [job for job in batch if detect_platform_by_user_id(job[2]) == PLATFORM_TELEGRAM]
+        vk_jobs = [job for job in batch if detect_platform_by_user_id(job[2]) != PLATFORM_TELEGRAM]
+    else:
+        single_jobs, vk_jobs = batch, []
+    await asyncio.gather(
+        run_broadcast(single_jobs, deliver, lambda job: job[2]),
+        deliver_vk_outbox_jobs(vk_jobs, record_sent, record_failure),
+    )
+
+    if sent_ids:
+        await execute_query_async(
+            "UPDATE outbox SET status = 'sent', sent_at = NOW() WHERE outbox_id = ANY(%s)",
+            (sent_ids,)
+        )
+    if failed:
+        await execute_query_async(
+            """
+            UPDATE outbox o
+            SET status = 'failed', last_error = f.error
+            FROM unnest(%s::BIGINT[], %s::TEXT[]) AS f(outbox_id, error)
+            WHERE o.outbox_id = f.outbox_id
+            """,
+            ([outbox_id for outbox_id, _ in failed], [error for _, error in failed])
+        )
+    if unreachable:
+        await execute_query_async(
+            """
+            UPDATE users u
+            SET unreachable_since = COALESCE(u.unreachable_since, NOW()), unreachable_reason = f.reason
+            FROM unnest(%s::BIGINT[], %s::TEXT[]) AS f(user_id, reason)
+            WHERE u.user_id = f.user_id
+            """,
+            (list(unreachable), list(unreachable.values()))
+        )
+        for user_id in unreachable:
+            forget_user_profile(user_id)
+    if retries:
+        await execute_query_async(
+            """
+            UPDATE outbox o
+            SET status = 'pending',
+                last_error = r.error,
+                next_attempt_at = NOW() + make_interval(secs => r.delay)
+            FROM unnest(%s::BIGINT[], %s::TEXT[], %s::FLOAT8[]) AS r(outbox_id, error, delay)
+            WHERE o.outbox_id = r.outbox_id
+            """,
+            (
+                [outbox_id for outbox_id, _, _ in retries],
+                [error for _, error, _ in retries],
+                [delay for _, _, delay in retries],
+            )
+        )
+
+
+async def report_outbox_campaigns(campaign_ids):
+    rows = await execute_query_async(
+        """
+        SELECT c.campaign_id, c.title, c.requested_by,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE o.status = 'sent'),
+               COUNT(*) FILTER (WHERE o.status = 'failed'),
+               COUNT(*) FILTER (WHERE o.status IN ('pending', 'sending'))
+        FROM outbox_campaigns c
+        JOIN outbox o ON o.campaign_id = c.campaign_id
+        WHERE c.campaign_id = ANY(%s) AND c.completed_at IS NULL
+        GROUP BY c.campaign_id
+        """,
+        (list(campaign_ids),),
+        fetch=True
+    )
+    for campaign_id, title, requested_by, total, sent, failed, remaining in rows:
+        if remaining:
+            if not requested_by:
+                continue
+            # Первую пачку не показываем, чтобы короткие рассылки не присылали лишних сообщений
+            progress = outbox_progress.get(campaign_id)
+            if progress is None:
+                outbox_progress[campaign_id] = {"report": progress_reporter(requested_by, title), "reported_at": time.monotonic()}
+            elif time.monotonic() - progress["reported_at"] >= BROADCAST_PROGRESS_INTERVAL_SECONDS:
+                progress["reported_at"] = time.monotonic()
+                try:
+                    await progress["report"](sent + failed, total)
+                except Exception as e:
+                    logging.warning(f"Не удалось обновить прогресс рассылки: {e}")
+            continue
+
+        outbox_progress.pop(campaign_id, None)
+        finished = await execute_query_async(
+            "UPDATE outbox_campaigns SET completed_at = NOW() WHERE campaign_id = %s AND completed_at IS NULL RETURNING 1",
+            (campaign_id,),
+            fetchone=True
+        )
+        if finished:
+            summary = f"✅{title}: доставлено {sent} из {total}"
+            if failed:
+                summary += f", не удалось доставить {failed}"
+            # Итог рассылок, запущенных самим ботом (например, wake-up), получают админы
+            if not requested_by:
+                await notify_admin(summary + ".")
+                continue
+            try:
+                await send_text_to_user(requested_by, summary + ".")
+            except Exception as e:
+                logging.warning(f"Не удалось отправить итог рассылки: {e}")
+
+
+async def outbox_worker():
+    # Бот работает одним процессом (второй Telegram polling не даст запуститься), поэтому
+    # строки, оставшиеся в статусе 'sending' после падения, возвращаем в очередь
+    await execute_query_async("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+    while True:
+        try:
+            outbox_wakeup.clear()
+            batch = await claim_outbox_batch()
+            if not batch:
+                try:
+                    await asyncio.wait_for(outbox_wakeup.wait(), OUTBOX_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await deliver_outbox_batch(batch)
+            await report_outbox_campaigns({row[1] for row in batch})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"Ошибка воркера рассылок: {e}")
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL_SECONDS)
+
+
+ADMIN_NOTIFY_DIGEST_SECONDS = float(os.environ.get("ADMIN_NOTIFY_DIGEST_SECONDS", "10"))
+TELEGRAM_MESSAGE_MAX_LENGTH = 4096
+
+admin_notifications = asyncio.Queue()
+
+
 async def notify_admin(text: str):
-    for admin_id in ADMIN_IDS:
-        await bot.send_message(admin_id, text)
+    # Не ждем Telegram в пользовательском обработчике: уведомление уйдет из admin_notification_worker
+    admin_notifications.put_nowait(text)
+
+
+def split_message_text(text: str, limit: int = TELEGRAM_MESSAGE_MAX_LENGTH):
+    # Режем по последнему переносу строки в пределах лимита, а если его нет — прямо по лимиту
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+def build_admin_digests(notices):
+    if len(notices) == 1:
+        return split_message_text(notices[0])
+
+    header = f"📋Уведомления ({len(notices)}):"
+    # Куски не длиннее лимита за вычетом заголовка: первый всегда помещается рядом с заголовком
+    pieces = [
+        piece
+        for notice in notices
+        for piece in split_message_text(notice, TELEGRAM_MESSAGE_MAX_LENGTH - len(header) - 2)
+    ]
+    digests = []
+    current = header
+    for piece in pieces:
+        if len(current) + len(piece) + 2 > TELEGRAM_MESSAGE_MAX_LENGTH:
+            digests.append(current)
+            current = piece
+        else:
+            current += "\n\n" + piece
+    digests.append(current)
+    return digests
+
+
+async def send_admin_notices(notices):
+    async def send_to_admin(admin_id: int):
+        for digest in build_admin_digests(notices):
+            try:
+                await bot.send_message(admin_id, digest)
+            except Exception as e:
+                logging.warning(f"Не удалось отправить уведомление админу {admin_id}: {e}")
+
+    await asyncio.gather(*(send_to_admin(admin_id) for admin_id in ADMIN_IDS))
+
+
+async def admin_notification_worker():
+    """Собирает уведомления за ADMIN_NOTIFY_DIGEST_SECONDS и отправляет каждому админу одной сводкой."""
+    notices = []
+    try:
+        while True:
+            notices.append(await admin_notifications.get())
+            deadline = time.monotonic() + ADMIN_NOTIFY_DIGEST_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    notices.append(await asyncio.wait_for(admin_notifications.get(), deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+            # Очищаем только после отправки: при остановке посреди нее пачка будет дослана ниже
+            await send_admin_notices(notices)
+            notices = []
+    except asyncio.CancelledError:
+        # При остановке досылаем накопленное, чтобы не терять записи игроков
+        while not admin_notifications.empty():
+            notices.append(admin_notifications.get_nowait())
+        if notices:
+            await send_admin_notices(notices)
+        raise
 
 
 def build_new_user_notification_text(
@@ -309,55 +1140,229 @@ def build_game_title(game_name: str, game_date: str) -> str:
     return f"{game_date} {game_name}"
 
 
-def fetch_active_games(include_deleted: bool = False):
-    if include_deleted:
-        return sort_games_by_date(
-            execute_query("SELECT game_id, game_name, game_date, is_deleted FROM games", fetch=True)
-        )
-    return sort_games_by_date(
-        execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True)
-    )
+GAMES_ORDER_BY = "ORDER BY game_on NULLS LAST, game_date"
+GAMES_CATALOG_TTL_SECONDS = float(os.environ.get("GAMES_CATALOG_TTL_SECONDS", "60"))
 
+# Каталог игр в памяти: все игры одной выборкой, уже отсортированные по дате,
+# плюс индексы по game_id и по тексту кнопки.
+# Сбрасывается после добавления/удаления/восстановления/отмены игры админом;
+# TTL нужен на случай, если бот запущен в нескольких процессах.
+games_catalog = {"games": None, "by_id": None, "labels": None, "loaded_at": 0.0, "generation": 0}
+games_catalog_stats = {"hits": 0, "misses": 0}
 
-def fetch_upcoming_games():
-    return sort_games_by_date(filter_upcoming_games(fetch_active_games()))
 
+def invalidate_games_catalog():
+    games_catalog["games"] = None
+    games_catalog["generation"] += 1
+    games_keyboard_cache.clear()
 
-async def format_user_participants_async(game_id: int, title: str) -> str:
-    participants = execute_query(
+
+async def delete_game(game_id: int):
+    # Одной транзакцией убираем игру вместе с записями, «думающими» и счетчиком мест
+    await execute_query_async(
         """
-        SELECT u.user_id, u.mafia_nick
-        FROM registrations r
-        JOIN users u ON r.user_id = u.user_id
-        WHERE r.game_id = %s AND r.status = %s
+        DELETE FROM registrations WHERE game_id = %(game_id)s;
+        DELETE FROM thinking_players WHERE game_id = %(game_id)s;
+        DELETE FROM game_seat_counters WHERE game_id = %(game_id)s;
+        DELETE FROM games WHERE game_id = %(game_id)s;
         """,
-        (game_id, 'registered'),
+        {"game_id": game_id},
+    )
+    invalidate_games_catalog()
+    invalidate_participants_cache(game_id)
+
+
+def get_games_catalog_stats() -> dict:
+    games = games_catalog["games"]
+    return {**games_catalog_stats, "size": len(games) if games is not None else 0}
+
+
+def game_button_labels(game_name: str, game_date: str):
+    # Кнопки бывают «дата название» и «название дата», у спортивной мафии в меню 🏆 заменяется на 🌃
+    return {
+        f"{game_date} {game_name}",
+        f"{game_name} {game_date}",
+        f"{game_date} {game_name.replace('🏆', '🌃')}",
+    }
+
+
+async def load_games_catalog():
+    generation = games_catalog["generation"]
+    rows = await execute_query_async(
+        f"SELECT game_id, game_name, game_date, is_deleted, game_on FROM games {GAMES_ORDER_BY}",
         fetch=True
     )
-    thinking_users = set(await get_thinking(game_id))
-    late_users = set(await get_late_players(game_id))
+    games = tuple(tuple(row) for row in rows)
+    by_id = {}
+    labels = {}
+    for game in games:
+        game_id, game_name, game_date = game[:3]
+        by_id[game_id] = game
+        for label in game_button_labels(game_name, game_date):
+            labels.setdefault(label, []).append(game)
+
+    catalog = {"games": games, "by_id": by_id, "labels": labels}
+    if games_catalog["generation"] == generation:
+        games_catalog.update(catalog, loaded_at=time.monotonic())
+    return catalog
+
+
+async def get_games_catalog():
+    if games_catalog["games"] is not None and time.monotonic() - games_catalog["loaded_at"] < GAMES_CATALOG_TTL_SECONDS:
+        games_catalog_stats["hits"] += 1
+        return games_catalog
+    games_catalog_stats["misses"] += 1
+    return await load_games_catalog()
+
+
+async def fetch_active_games(include_deleted: bool = False):
+    games = (await get_games_catalog())["games"]
+    if include_deleted:
+        return [(game_id, name, date, is_deleted) for game_id, name, date, is_deleted, _ in games]
+    return [(game_id, name, date) for game_id, name, date, is_deleted, _ in games if not is_deleted]
 
-    if not participants and not thinking_users:
-        return f"На игру {title} пока никто не записался."
 
-    response = f"Список участников на игру {title}:\n"
-    participant_ids = {uid for uid, _ in participants}
-    regular_participants = [p for p in participants if p[0] not in late_users]
-    late_participants = [p for p in participants if p[0] in late_users]
+async def fetch_deleted_games():
+    games = (await get_games_catalog())["games"]
+    return [(game_id, name, date) for game_id, name, date, is_deleted, _ in games if is_deleted]
+
+
+async def fetch_upcoming_games():
+    # Игры с нераспознанной датой (game_on IS NULL) считаем предстоящими и показываем в конце списка
+    today = datetime.date.today()
+    return [
+        (game_id, name, date)
+        for game_id, name, date, is_deleted, game_on in (await get_games_catalog())["games"]
+        if not is_deleted and (game_on is None or game_on >= today)
+    ]
+
+
+async def get_game_info(game_id: int, active_only: bool = False):
+    game = (await get_games_catalog())["by_id"].get(game_id)
+    if not game or (active_only and game[3]):
+        return None
+    return game[1], game[2]
+
+
+async def find_game_by_label(text: str, is_deleted: bool = False):
+    """Ищет игру по тексту кнопки. is_deleted=None — среди всех игр, включая удалённые."""
+    label = (text or "").replace("📆", "").replace("📅", "").strip()
+    for game_id, game_name, game_date, game_is_deleted, _ in (await get_games_catalog())["labels"].get(label, ()):
+        if is_deleted is None or game_is_deleted == is_deleted:
+            return game_id, game_name, game_date
+    return None
 
+
+async def get_game_seat_counts(game_id: int):
+    row = await execute_query_async(
+        "SELECT registered, late_registered, thinking FROM game_seat_counters WHERE game_id = %s",
+        (game_id,),
+        fetchone=True
+    )
+    return row if row else (0, 0, 0)
+
+
+async def fetch_game_roster(game_id: int):
+    # Один запрос вместо выборки участников, «думающих», опоздавших и профиля каждого думающего.
+    # Сначала идут записавшиеся без опоздания, затем опаздывающие, затем только думающие;
+    # внутри группы — по времени записи, при равенстве и у думающих — по user_id.
+    return await execute_query_async(
+        """
+        SELECT u.user_id, u.first_name, u.last_name, u.mafia_nick, u.telegram_username, u.vk_username,
+               u.platform, u.platform_user_id,
+               r.user_id IS NOT NULL AS is_registered,
+               COALESCE(r.is_late, FALSE) AS is_late,
+               t.user_id IS NOT NULL AS is_thinking
+        FROM (
+            SELECT user_id, is_late, registered_at
+            FROM registrations
+            WHERE game_id = %(game_id)s AND status = 'registered'
+        ) r
+        FULL JOIN (
+            SELECT user_id FROM thinking_players WHERE game_id = %(game_id)s
+        ) t ON t.user_id = r.user_id
+        JOIN users u ON u.user_id = COALESCE(r.user_id, t.user_id)
+        ORDER BY r.user_id IS NULL, COALESCE(r.is_late, FALSE), r.registered_at, u.user_id
+        """,
+        {"game_id": game_id},
+        fetch=True
+    )
+
+
+def render_participant_lines(roster, participants_format: str = None) -> str:
+    lines = []
     idx = 1
-    for uid, nick in regular_participants + late_participants:
-        mark = " (думает)" if uid in thinking_users else ""
-        late_mark = " (опоздает)" if uid in late_users else ""
-        response += f"{idx}. {nick}{mark}{late_mark}\n"
+    for (
+        _, first_name, last_name, nick, tg_username, vk_username, platform, platform_user_id,
+        is_registered, is_late, is_thinking,
+    ) in roster:
+        if participants_format is None:
+            participant_view = nick
+        else:
+            participant_view = build_admin_participant_display(
+                first_name,
+                last_name,
+                nick,
+                platform,
+                platform_user_id,
+                tg_username,
+                vk_username,
+                participants_format,
+            )
+
+        if not is_registered:
+            lines.append(f"- {participant_view} (думает)")
+            continue
+
+        mark = " (думает)" if is_thinking else ""
+        late_mark = " (опоздает)" if is_late else ""
+        lines.append(f"{idx}. {participant_view}{mark}{late_mark}")
         idx += 1
+    return "\n".join(lines)
+
+
+# Кэш отрисованных списков участников: (game_id, формат) -> текст списка без заголовка.
+# Формат None — пользовательский вид, остальные — ADMIN_PARTICIPANTS_FORMAT_*.
+# Общий для Telegram и VK, сбрасывается на всех путях записи/отмены/опоздания/«думаю».
+participants_cache = {}
+participants_cache_generations = {}
+participants_cache_stats = {"hits": 0, "misses": 0}
 
-    for uid in thinking_users:
-        if uid not in participant_ids:
-            ud = execute_query("SELECT mafia_nick FROM users WHERE user_id=%s", (uid,), fetchone=True)
-            if ud:
-                response += f"- {ud[0]} (думает)\n"
-    return response.strip()
+
+def invalidate_participants_cache(game_id: int):
+    participants_cache_generations[game_id] = participants_cache_generations.get(game_id, 0) + 1
+    for participants_format in [None, *ADMIN_PARTICIPANTS_FORMAT_LABELS]:
+        participants_cache.pop((game_id, participants_format), None)
+
+
+def get_participants_cache_stats() -> dict:
+    return {**participants_cache_stats, "size": len(participants_cache)}
+
+
+async def get_rendered_participants(game_id: int, title: str, participants_format: str = None) -> str:
+    cache_key = (game_id, participants_format)
+    if cache_key in participants_cache:
+        participants_cache_stats["hits"] += 1
+        body = participants_cache[cache_key]
+    else:
+        participants_cache_stats["misses"] += 1
+        # Если список поменялся, пока мы его читали, устаревший результат в кэш не кладем
+        generation = participants_cache_generations.setdefault(game_id, 0)
+        registered_count, _, thinking_count = await get_game_seat_counts(game_id)
+        if registered_count or thinking_count:
+            body = render_participant_lines(await fetch_game_roster(game_id), participants_format)
+        else:
+            body = ""
+        if participants_cache_generations.get(game_id) == generation:
+            participants_cache[cache_key] = body
+
+    if not body:
+        return f"На игру {title} пока никто не записался."
+    return f"Список участников на игру {title}:\n{body}"
+
+
+async def format_user_participants_async(game_id: int, title: str) -> str:
+    return await get_rendered_participants(game_id, title)
 
 
 def build_admin_participant_display(
@@ -379,54 +1384,7 @@ def build_admin_participant_display(
 
 
 async def format_admin_participants_with_format(game_id: int, title: str, participants_format: str) -> str:
-    participants = execute_query(
-        """
-        SELECT u.user_id, u.first_name, u.last_name, u.mafia_nick, u.telegram_username, u.vk_username, u.platform, u.platform_user_id
-        FROM registrations r
-        JOIN users u ON r.user_id = u.user_id
-        WHERE r.game_id = %s AND r.status = %s
-        """,
-        (game_id, 'registered'),
-        fetch=True
-    )
-    thinking_users = set(await get_thinking(game_id))
-    late_users = set(await get_late_players(game_id))
-
-    if not participants and not thinking_users:
-        return f"На игру {title} пока никто не записался."
-
-    response = f"Список участников на игру {title}:\n"
-    ordered_participants = [p for p in participants if p[0] not in late_users] + [p for p in participants if p[0] in late_users]
-
-    for idx, (user_id, first_name, last_name, nick, tg_username, vk_username, platform, platform_user_id) in enumerate(ordered_participants, start=1):
-        mark = " (думает)" if user_id in thinking_users else ""
-        late_mark = " (опоздает)" if user_id in late_users else ""
-        participant_view = build_admin_participant_display(
-            first_name,
-            last_name,
-            nick,
-            platform,
-            platform_user_id,
-            tg_username,
-            vk_username,
-            participants_format,
-        )
-        response += f"{idx}. {participant_view}{mark}{late_mark}\n"
-
-    participant_ids = {user_id for user_id, *_ in participants}
-    for uid in thinking_users:
-        if uid not in participant_ids:
-            ud = execute_query(
-                "SELECT first_name, last_name, mafia_nick, telegram_username, vk_username, platform, platform_user_id FROM users WHERE user_id=%s",
-                (uid,),
-                fetchone=True
-            )
-            if ud:
-                participant_view = build_admin_participant_display(
-                    ud[0], ud[1], ud[2], ud[5], ud[6], ud[3], ud[4], participants_format
-                )
-                response += f"- {participant_view} (думает)\n"
-    return response.strip()
+    return await get_rendered_participants(game_id, title, participants_format)
 
 # Состояния FSM
 class Form(StatesGroup):
@@ -470,8 +1428,45 @@ class Form(StatesGroup):
     admin_manual_register_nick = State()
     admin_manual_register_action = State()
 
+KEYBOARD_CACHE_SIZE = int(os.environ.get("KEYBOARD_CACHE_SIZE", "500"))
+# Готовые клавиатуры: разметка Telegram и JSON для VK собираются один раз на набор аргументов.
+# Клавиатуры со списками игр лежат отдельно и сбрасываются вместе с каталогом игр
+keyboard_cache = {}
+games_keyboard_cache = {}
+
+
+def keyboard_cache_key(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(keyboard_cache_key(item) for item in value)
+    return value
+
+
+def cached_keyboard(cache):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, keyboard_cache_key(args), keyboard_cache_key(sorted(kwargs.items())))
+            markup = cache.get(key)
+            if markup is None:
+                if len(cache) >= KEYBOARD_CACHE_SIZE:
+                    cache.clear()
+                markup = cache[key] = func(*args, **kwargs)
+            return markup
+        return wrapper
+    return decorator
+
+
+def get_keyboard_cache_stats() -> dict:
+    return {"static": len(keyboard_cache), "games": len(games_keyboard_cache)}
+
+
 # Главное меню
 def main_menu_keyboard(user_id):
+    return build_main_menu_keyboard(is_telegram_admin(user_id))
+
+
+@cached_keyboard(keyboard_cache)
+def build_main_menu_keyboard(is_admin: bool):
     builder = ReplyKeyboardBuilder()
     builder.button(text="📝Записаться на игру")
     builder.button(text="❌Отменить запись")
@@ -479,11 +1474,12 @@ def main_menu_keyboard(user_id):
     builder.button(text="📅Расписание игр")
     builder.button(text="👥Список участников")
     builder.button(text="📍Как до нас добраться?")
-    if is_telegram_admin(user_id):
+    if is_admin:
         builder.button(text="⚙️Админ-панель")
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
+@cached_keyboard(keyboard_cache)
 def admin_menu_keyboard():
     builder = ReplyKeyboardBuilder()
     builder.button(text="➕Добавить игру")
@@ -501,6 +1497,11 @@ def admin_menu_keyboard():
 
 
 def vk_main_menu_keyboard(user_id: int = None):
+    return build_vk_main_menu_keyboard(user_id == make_internal_user_id(PLATFORM_VK, VK_ADMIN_ID))
+
+
+@cached_keyboard(keyboard_cache)
+def build_vk_main_menu_keyboard(is_admin: bool):
     keyboard = VkKeyboard(one_time=False)
     keyboard.add_button("📝Записаться на игру", color=VkKeyboardColor.SECONDARY, payload={"command": "register"})
     keyboard.add_button("❌Отменить запись", color=VkKeyboardColor.SECONDARY, payload={"command": "cancel_registration"})
@@ -510,12 +1511,13 @@ def vk_main_menu_keyboard(user_id: int = None):
     keyboard.add_line()
     keyboard.add_button("👥Список участников", color=VkKeyboardColor.SECONDARY, payload={"command": "participants"})
     keyboard.add_button("📍Как до нас добраться?", color=VkKeyboardColor.SECONDARY, payload={"command": "location"})
-    if user_id == make_internal_user_id(PLATFORM_VK, VK_ADMIN_ID):
+    if is_admin:
         keyboard.add_line()
         keyboard.add_button("⚙️Админ-панель", color=VkKeyboardColor.SECONDARY, payload={"command": "admin_panel"})
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_admin_menu_keyboard():
     keyboard = VkKeyboard(one_time=False)
     keyboard.add_button("➕Добавить игру", color=VkKeyboardColor.SECONDARY, payload={"command": "admin_add_game"})
@@ -533,6 +1535,7 @@ def vk_admin_menu_keyboard():
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def admin_participants_format_keyboard():
     builder = ReplyKeyboardBuilder()
     builder.button(text=ADMIN_PARTICIPANTS_FORMAT_LABELS[ADMIN_PARTICIPANTS_FORMAT_NAME])
@@ -544,15 +1547,16 @@ def admin_participants_format_keyboard():
 
 # Helper для "думающих" (теперь в БД)
 async def mark_thinking(user_id: int, game_id: int):
-    execute_query("INSERT INTO thinking_players (user_id, game_id) VALUES (%s, %s) ON CONFLICT DO NOTHING", (user_id, game_id))
+    await execute_query_async("INSERT INTO thinking_players (user_id, game_id) VALUES (%s, %s) ON CONFLICT DO NOTHING", (user_id, game_id))
+    invalidate_participants_cache(game_id)
 
 async def get_thinking(game_id: int):
-    rows = execute_query("SELECT user_id FROM thinking_players WHERE game_id = %s", (game_id,), fetch=True)
+    rows = await execute_query_async("SELECT user_id FROM thinking_players WHERE game_id = %s", (game_id,), fetch=True)
     return [r[0] for r in rows]
 
 async def mark_late(user_id: int, game_id: int):
     try:
-        execute_query(
+        await execute_query_async(
             """
             UPDATE registrations
             SET is_late = TRUE
@@ -562,117 +1566,102 @@ async def mark_late(user_id: int, game_id: int):
         )
     except Exception as e:
         logging.warning(f"Не удалось обновить registrations.is_late: {e}")
-
-    # legacy-совместимость со старыми данными
-    try:
-        execute_query(
-            "INSERT INTO late_players (user_id, game_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
-            (user_id, game_id)
-        )
-    except Exception as e:
-        logging.warning(f"Не удалось записать late_players: {e}")
+    invalidate_participants_cache(game_id)
 
 async def unmark_late(user_id: int, game_id: int):
     try:
-        execute_query(
-            "UPDATE registrations SET is_late = FALSE WHERE user_id = %s AND game_id = %s",
+        await execute_query_async(
+            "UPDATE registrations SET is_late = FALSE WHERE user_id = %s AND game_id = %s AND is_late",
             (user_id, game_id)
         )
     except Exception as e:
         logging.warning(f"Не удалось сбросить registrations.is_late: {e}")
-
-    try:
-        execute_query(
-            "DELETE FROM late_players WHERE user_id = %s AND game_id = %s",
-            (user_id, game_id)
-        )
-    except Exception as e:
-        logging.warning(f"Не удалось удалить late_players: {e}")
+    invalidate_participants_cache(game_id)
 
 async def get_late_players(game_id: int):
-    late_ids = set()
-
     try:
-        rows = execute_query(
+        rows = await execute_query_async(
             "SELECT user_id FROM registrations WHERE game_id = %s AND status = 'registered' AND is_late = TRUE",
             (game_id,),
             fetch=True
         )
-        late_ids.update(int(uid) for (uid,) in rows)
     except Exception as e:
         logging.warning(f"Не удалось прочитать registrations.is_late: {e}")
+        return set()
+    return {int(uid) for (uid,) in rows}
 
-    # fallback + совместимость с уже сохраненными отметками
-    try:
-        rows = execute_query("SELECT user_id FROM late_players WHERE game_id = %s", (game_id,), fetch=True)
-        late_ids.update(int(uid) for (uid,) in rows)
-    except Exception as e:
-        logging.warning(f"Не удалось прочитать late_players: {e}")
+@cached_keyboard(games_keyboard_cache)
+def games_reply_keyboard(games, name_first: bool = False, back_label: str = "🔙Назад"):
+    builder = ReplyKeyboardBuilder()
+    for _, name, date in games:
+        builder.button(text=f"{name} {date}" if name_first else f"{date} {name}")
+    builder.button(text=back_label)
+    builder.adjust(1)
+    return builder.as_markup(resize_keyboard=True)
 
-    return late_ids
 
-def late_button_keyboard(game_id: int):
+@cached_keyboard(games_keyboard_cache)
+def games_inline_keyboard(games, callback_prefix: str, icon: str = "📆"):
     builder = InlineKeyboardBuilder()
-    builder.button(text="⏰Опоздаю", callback_data=f"late_{game_id}")
+    for game_id, name, date in games:
+        display_name = name
+        if "Спортивная мафия" in name and "🌃" not in name:
+            display_name = name.replace("🏆", "🌃")
+        builder.button(text=f"{icon}{date} {display_name}", callback_data=f"{callback_prefix}{game_id}")
+    builder.button(text="🔙В меню", callback_data="menu_back")
+    builder.adjust(1)
     return builder.as_markup()
 
 
-def thinking_reminder_keyboard(game_id: int):
+@cached_keyboard(games_keyboard_cache)
+def late_button_keyboard(game_id: int):
     builder = InlineKeyboardBuilder()
-    builder.button(text="Да, приду", callback_data=f"thinkrem_yes_{game_id}")
-    builder.button(text="Нет, не смогу", callback_data=f"thinkrem_no_{game_id}")
-    builder.button(text="Все еще думаю", callback_data=f"thinkrem_still_{game_id}")
-    builder.adjust(1)
+    builder.button(text="⏰Опоздаю", callback_data=f"late_{game_id}")
     return builder.as_markup()
 
-def parse_game_date(game_date: str):
-    if not game_date:
-        return None
-
-    normalized = game_date.strip()
-    parts = normalized.split()
-    if len(parts) >= 2 and parts[0] in ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']:
-        normalized = parts[1]
 
-    for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%d.%m.%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%d.%m"):
-        try:
-            parsed = datetime.datetime.strptime(normalized, fmt).date()
-            if fmt == "%d.%m":
-                return parsed.replace(year=datetime.date.today().year)
-            return parsed
-        except ValueError:
-            continue
-    return None
-
-def is_upcoming_game(game_date: str) -> bool:
-    parsed = parse_game_date(game_date)
-    if not parsed:
-        return True
-    return parsed >= datetime.date.today()
-
-def filter_upcoming_games(games):
-    return [game for game in games if is_upcoming_game(game[2])]
-
-
-def sort_games_by_date(games, date_index: int = 2):
-    def sort_key(game):
-        parsed = parse_game_date(game[date_index])
-        if parsed is None:
-            return (1, datetime.date.max, str(game[date_index]))
-        return (0, parsed, str(game[date_index]))
+@cached_keyboard(games_keyboard_cache)
+def telegram_reminder_keyboard(game_id: int, is_registered: bool):
+    builder = InlineKeyboardBuilder()
+    if is_registered:
+        builder.button(text="❌Отменить запись", callback_data=f"cancelreg_{game_id}")
+        builder.button(text="⏰Опоздаю", callback_data=f"late_{game_id}")
+    else:
+        builder.button(text="📝Записаться", callback_data=f"reg_{game_id}")
+        builder.button(text="🤔Думаю", callback_data=f"think_{game_id}")
+        builder.button(text="❌Не приду", callback_data=f"decline_{game_id}")
+        builder.adjust(2)
+    return builder.as_markup()
 
-    return sorted(games, key=sort_key)
 
+@cached_keyboard(games_keyboard_cache)
+def thinking_reminder_keyboard(game_id: int):
+    builder = InlineKeyboardBuilder()
+    builder.button(text="Да, приду", callback_data=f"thinkrem_yes_{game_id}")
+    builder.button(text="Нет, не смогу", callback_data=f"thinkrem_no_{game_id}")
+    builder.button(text="Все еще думаю", callback_data=f"thinkrem_still_{game_id}")
+    builder.adjust(1)
+    return builder.as_markup()
 
-def next_platform_user_id(platform: str) -> int:
-    row = execute_query(
-        "SELECT COALESCE(MAX(ABS(platform_user_id)), 0) + 1 FROM users WHERE platform = %s AND platform_user_id IS NOT NULL",
-        (platform,),
-        fetchone=True
-    )
-    return int(row[0]) if row and row[0] is not None else 1
+async def next_manual_player_id() -> int:
+    # id берется из последовательности; если он уже занят реальным пользователем Telegram, берем следующий
+    while True:
+        row = await execute_query_async(
+            """
+            SELECT s.id
+            FROM (SELECT nextval('manual_player_id_seq') AS id) s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM users WHERE platform = %s AND platform_user_id = s.id
+            )
+            """,
+            (PLATFORM_TELEGRAM,),
+            fetchone=True
+        )
+        if row:
+            return int(row[0])
 
 
+@cached_keyboard(keyboard_cache)
 def admin_manual_action_keyboard():
     builder = ReplyKeyboardBuilder()
     builder.button(text="✅Записать игрока")
@@ -688,31 +1677,119 @@ def get_game_limit(game_name: str) -> int:
         return 12
     return 15
 
-async def is_game_full(game_id: int, game_name: str, user_id: int) -> bool:
-    existing = execute_query(
-        "SELECT status FROM registrations WHERE user_id=%s AND game_id=%s",
-        (user_id, game_id),
-        fetchone=True
-    )
-    if existing and existing[0] == "registered":
-        return False
+REGISTRATION_OK = "ok"
+REGISTRATION_GAME_NOT_FOUND = "game_not_found"
+REGISTRATION_AGE_REJECTED = "age_rejected"
+REGISTRATION_GAME_FULL = "game_full"
 
-    registered_users = execute_query(
-        "SELECT user_id FROM registrations WHERE game_id=%s AND status='registered'",
-        (game_id,),
-        fetch=True
+
+class RegistrationResult(NamedTuple):
+    status: str
+    game_name: str = None
+    game_date: str = None
+    age_rejection: str = None
+    has_profile: bool = False
+    first_name: str = None
+    last_name: str = None
+    mafia_nick: str = None
+
+
+def register_user_for_game(user_id: int, game_id: int, active_only: bool = False) -> RegistrationResult:
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Блокируем строку игры, чтобы параллельные записи на нее выполнялись по очереди.
+            # Второй SELECT в режиме READ COMMITTED берет новый снимок уже после получения блокировки,
+            # поэтому видит записи, закоммиченные конкурентом. Оба запроса уходят за один round trip.
+            cursor.execute(
+                """
+                SELECT 1 FROM games WHERE game_id = %(game_id)s FOR UPDATE;
+                SELECT g.game_name, g.game_date, g.is_deleted,
+                       u.user_id IS NOT NULL, u.age, u.first_name, u.last_name, u.mafia_nick,
+                       r.status,
+                       COALESCE(c.registered, 0),
+                       COALESCE(c.late_registered, 0)
+                FROM games g
+                LEFT JOIN game_seat_counters c ON c.game_id = g.game_id
+                LEFT JOIN users u ON u.user_id = %(user_id)s
+                LEFT JOIN registrations r ON r.user_id = %(user_id)s AND r.game_id = g.game_id
+                WHERE g.game_id = %(game_id)s
+                """,
+                {"user_id": user_id, "game_id": game_id},
+            )
+            row = cursor.fetchone()
+            if not row or (active_only and row[2]):
+                conn.rollback()
+                return RegistrationResult(REGISTRATION_GAME_NOT_FOUND)
+
+            (
+                game_name, game_date, _, has_profile, user_age, first_name, last_name, mafia_nick,
+                current_status, registered_count, late_registered_count,
+            ) = row
+            profile = {
+                "has_profile": has_profile,
+                "first_name": first_name,
+                "last_name": last_name,
+                "mafia_nick": mafia_nick,
+            }
+
+            age_rejection = get_registration_age_rejection(game_name, user_age)
+            if age_rejection:
+                conn.rollback()
+                return RegistrationResult(REGISTRATION_AGE_REJECTED, game_name, game_date, age_rejection, **profile)
+
+            limit = get_game_limit(game_name) + late_registered_count
+            if current_status != "registered" and registered_count >= limit:
+                conn.rollback()
+                return RegistrationResult(REGISTRATION_GAME_FULL, game_name, game_date, **profile)
+
+            cursor.execute(
+                """
+                WITH dropped_thinking AS (
+                    DELETE FROM thinking_players WHERE user_id = %(user_id)s AND game_id = %(game_id)s
+                )
+                INSERT INTO registrations (user_id, game_id, status, is_late)
+                VALUES (%(user_id)s, %(game_id)s, 'registered', FALSE)
+                ON CONFLICT (user_id, game_id)
+                DO UPDATE SET status = 'registered', is_late = FALSE,
+                    registered_at = CASE WHEN registrations.status = 'registered' THEN registrations.registered_at ELSE NOW() END
+                """,
+                {"user_id": user_id, "game_id": game_id},
+            )
+            conn.commit()
+            return RegistrationResult(REGISTRATION_OK, game_name, game_date, **profile)
+        except Exception as e:
+            logging.error(f"Database error: {e}")
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+
+
+async def register_user_for_game_async(user_id: int, game_id: int, active_only: bool = False) -> RegistrationResult:
+    result = await run_db_call(register_user_for_game, user_id, game_id, active_only=active_only)
+    if result.status == REGISTRATION_OK:
+        invalidate_participants_cache(game_id)
+    return result
+
+
+async def cancel_user_registration(user_id: int, game_id: int):
+    await execute_query_async(
+        """
+        WITH dropped_thinking AS (
+            DELETE FROM thinking_players WHERE user_id = %(user_id)s AND game_id = %(game_id)s
+        )
+        DELETE FROM registrations WHERE user_id = %(user_id)s AND game_id = %(game_id)s
+        """,
+        {"user_id": user_id, "game_id": game_id},
     )
-    registered_ids = {uid for (uid,) in registered_users}
-    late_users = await get_late_players(game_id)
-    late_registered_count = len(registered_ids & late_users)
-    limit = get_game_limit(game_name) + late_registered_count
-    return len(registered_ids) >= limit
+    invalidate_participants_cache(game_id)
 
 WEEKDAY_GAME_RULES = "19:00 – сбор и объяснение правил\n19:30 – начало игр\n\n"
 
 
 def is_weekday_game(game_date: str) -> bool:
-    parsed = parse_game_date(game_date)
+    parsed = database.parse_game_date(game_date)
     if not parsed:
         return False
     return parsed.weekday() < 5
@@ -809,31 +1886,90 @@ def get_registration_age_rejection(game_name: str, user_age: int):
         return f"К сожалению, на игру {game_name} можно записаться только с {min_age} лет."
     return None
 
-async def wake_up_all_users():
-    users = execute_query("SELECT user_id FROM users", fetch=True)
+async def wake_up_all_users(active_days: int = WAKE_UP_ACTIVE_DAYS):
+    # Рассылка идет через outbox, а id кампании хранится в settings: если бот перезапустился,
+    # пока wake-up еще не разослан, воркер досылает оставшееся, а новая кампания не создается
+    row = await execute_query_async(
+        """
+        SELECT c.campaign_id
+        FROM settings s
+        JOIN outbox_campaigns c ON c.campaign_id = s.value
+        WHERE s.key = 'wake_up_campaign' AND c.completed_at IS NULL
+        """,
+        fetchone=True
+    )
+    if row:
+        logging.info(f"Wake-up: продолжаем незавершенную рассылку {row[0]}")
+        return
+
+    if active_days > 0:
+        users = await execute_query_async(
+            """
+            SELECT user_id FROM users
+            WHERE unreachable_since IS NULL
+              AND (last_seen_at IS NULL OR last_seen_at >= NOW() - make_interval(days => %s))
+            """,
+            (active_days,),
+            fetch=True
+        )
+    else:
+        users = await execute_query_async("SELECT user_id FROM users WHERE unreachable_since IS NULL", fetch=True)
     if not users:
         logging.info("Нет пользователей для wake-up уведомления")
         return
 
-    sent = 0
-    for (user_id,) in users:
+    campaign_id = uuid.uuid4().hex
+    await execute_query_async(
+        "INSERT INTO settings (key, value) VALUES ('wake_up_campaign', %s) ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value",
+        (campaign_id,)
+    )
+    queued = await enqueue_campaign(
+        "Wake-up",
+        [
+            OutboxMessage(user_id, "✅ Бот снова на связи после обновления. Можно пользоваться как обычно.")
+            for (user_id,) in users
+        ],
+        campaign_id=campaign_id
+    )
+
+    logging.info(f"Wake-up: в очередь поставлено {queued}/{len(users)} уведомлений")
+
+DB_UNAVAILABLE_TEXT = "Сейчас не получается связаться с базой данных😔 Попробуй, пожалуйста, через пару минут."
+
+
+@dp.update.outer_middleware()
+async def reachable_user_middleware(handler, event: types.Update, data: dict):
+    user = data.get("event_from_user")
+    if user and not user.is_bot:
         try:
-            await send_text_to_user(
-                user_id,
-                "✅ Бот снова на связи после обновления. Можно пользоваться как обычно."
-            )
-            sent += 1
-            await asyncio.sleep(0.03)
-        except Exception as e:
-            logging.warning(f"Wake-up: не удалось отправить сообщение пользователю {user_id}: {e}")
+            await mark_user_reachable(telegram_internal_user_id(user))
+            await touch_user_activity(telegram_internal_user_id(user))
+        except (database.DatabaseUnavailable, database.PoolTimeout):
+            pass
+        except Exception as exc:
+            # Служебная отметка не должна ронять обработку самого апдейта
+            logging.warning(f"Не удалось обновить активность пользователя {user.id}: {exc}")
+    return await handler(event, data)
 
-    logging.info(f"Wake-up завершен: уведомлено {sent}/{len(users)} пользователей")
+
+@dp.errors(ExceptionTypeFilter(database.DatabaseUnavailable, database.PoolTimeout))
+async def database_unavailable_handler(event: types.ErrorEvent):
+    logging.warning("Апдейт не обработан: база данных недоступна (%s)", event.exception)
+    update = event.update
+    try:
+        if update.message:
+            await update.message.answer(DB_UNAVAILABLE_TEXT)
+        elif update.callback_query:
+            await update.callback_query.answer(DB_UNAVAILABLE_TEXT, show_alert=True)
+    except Exception as exc:
+        logging.error(f"Не удалось сообщить пользователю о недоступности базы: {exc}")
+    return True
 
 # ===================== /start и профиль =====================
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
     internal_user_id = telegram_internal_user_id(message.from_user)
-    user = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id = %s", (internal_user_id,), fetchone=True)
+    user = await get_user_names(internal_user_id)
 
     if user:
         await message.answer(
@@ -854,6 +1990,32 @@ async def cmd_start(message: types.Message, state: FSMContext):
     )
     await state.set_state(Form.start)
 
+@dp.message(Command("cache_stats"))
+async def cmd_cache_stats(message: types.Message):
+    if not is_telegram_admin(message.from_user.id):
+        return
+    stats = get_participants_cache_stats()
+    games_stats = get_games_catalog_stats()
+    profile_stats = get_user_profile_cache_stats()
+    keyboard_stats = get_keyboard_cache_stats()
+    await message.answer(
+        "Кэш списков участников:\n"
+        f"Попаданий: {stats['hits']}\n"
+        f"Промахов: {stats['misses']}\n"
+        f"Записей в кэше: {stats['size']}\n\n"
+        "Каталог игр:\n"
+        f"Попаданий: {games_stats['hits']}\n"
+        f"Промахов: {games_stats['misses']}\n"
+        f"Игр в каталоге: {games_stats['size']}\n\n"
+        "Кэш профилей:\n"
+        f"Попаданий: {profile_stats['hits']}\n"
+        f"Промахов: {profile_stats['misses']}\n"
+        f"Профилей в кэше: {profile_stats['size']}\n\n"
+        "Кэш клавиатур:\n"
+        f"Постоянных: {keyboard_stats['static']}\n"
+        f"Со списками игр: {keyboard_stats['games']}"
+    )
+
 @dp.message(Form.confirm_profile_update)
 async def process_confirm_profile_update(message: types.Message, state: FSMContext):
     user_text = (message.text or "").strip().lower()
@@ -918,7 +2080,7 @@ async def process_age(message: types.Message, state: FSMContext):
         return
     await state.update_data(age=age)
     data = await state.get_data()
-    upsert_user(
+    await upsert_user(
         platform=PLATFORM_TELEGRAM,
         platform_user_id=message.from_user.id,
         first_name=data['first_name'],
@@ -1011,7 +2173,7 @@ async def edit_profile_age_handler(message: types.Message, state: FSMContext):
         return
 
     data = await state.get_data()
-    save_platform_profile(
+    await save_platform_profile(
         platform=PLATFORM_TELEGRAM,
         platform_user_id=message.from_user.id,
         first_name=data["edit_first_name"],
@@ -1043,91 +2205,53 @@ async def admin_menu_handler(message: types.Message, state: FSMContext):
         )
         await state.set_state(Form.add_game_date)
     elif message.text == "❌Удалить игру":
-        games = sort_games_by_date(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True))
+        games = await fetch_active_games()
         if not games:
             await message.answer("Список активных игр пуст.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{name} {date}")
-        builder.button(text="🔙 Назад")
-        builder.adjust(1)
-        await message.answer("Какую игру удалить?", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Какую игру удалить?", reply_markup=games_reply_keyboard(games, name_first=True, back_label="🔙 Назад"))
         await state.set_state(Form.delete_game)
     elif message.text == "♻️Восстановить игру":
-        games = sort_games_by_date(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = TRUE", fetch=True))
+        games = await fetch_deleted_games()
         if not games:
             await message.answer("Нет удаленных игр для восстановления.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{name} {date}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Какую игру восстановить?", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Какую игру восстановить?", reply_markup=games_reply_keyboard(games, name_first=True))
         await state.set_state(Form.restore_game)
     elif message.text == "👥Список участников":
-        games = sort_games_by_date(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True))
+        games = await fetch_active_games()
         if not games:
             await message.answer("Список игр пуст.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру для просмотра списка участников:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру для просмотра списка участников:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.view_participants)
     elif message.text == "✍️Ручная запись игрока":
-        games = sort_games_by_date(filter_upcoming_games(execute_query(
-            "SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE",
-            fetch=True
-        )))
+        games = await fetch_upcoming_games()
         if not games:
             await message.answer("Нет доступных игр для ручной записи.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру для ручной записи:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру для ручной записи:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.admin_manual_register_game)
     elif message.text == "🚫Отмена игры":
-        games = sort_games_by_date(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True))
+        games = await fetch_active_games()
         if not games:
             await message.answer("Список игр пуст.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру для отмены и уведомления игроков:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру для отмены и уведомления игроков:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.admin_cancel_game)
     elif message.text == "🔔Напомнить об игре":
-        games = sort_games_by_date(filter_upcoming_games(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True)))
+        games = await fetch_upcoming_games()
         if not games:
             await message.answer("Список игр пуст.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру, о которой нужно напомнить:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру, о которой нужно напомнить:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.admin_reminder)
     elif message.text == "📣Получить анонс":
-        games = sort_games_by_date(filter_upcoming_games(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True)))
+        games = await fetch_upcoming_games()
         if not games:
             await message.answer("Список игр пуст.")
             return
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру для анонса:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру для анонса:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.admin_get_announcement)
     elif message.text == "📢Рассылка":
         builder = ReplyKeyboardBuilder()
@@ -1161,7 +2285,7 @@ async def process_simple_calendar(callback_query: types.CallbackQuery, callback_
         day_str = days[date.weekday()]
         formatted_date = f"{day_str} {date.strftime('%d.%m')}"
 
-        await state.update_data(game_date=formatted_date)
+        await state.update_data(game_date=formatted_date, game_on=date.date().isoformat())
 
         builder = ReplyKeyboardBuilder()
         builder.button(text="🏙️Городская мафия")
@@ -1178,14 +2302,14 @@ async def process_simple_calendar(callback_query: types.CallbackQuery, callback_
 
 @dp.message(Form.add_game_date)
 async def process_add_game_date_text(message: types.Message, state: FSMContext):
-    parsed = parse_game_date(message.text)
+    parsed = database.parse_game_date(message.text)
     if not parsed:
         await message.answer("Не удалось распознать дату. Введите дату в формате ДД.ММ или ДД.ММ.ГГГГ.")
         return
 
     days = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
     formatted_date = f"{days[parsed.weekday()]} {parsed.strftime('%d.%m')}"
-    await state.update_data(game_date=formatted_date)
+    await state.update_data(game_date=formatted_date, game_on=parsed.isoformat())
 
     builder = ReplyKeyboardBuilder()
     builder.button(text="🏙️Городская мафия")
@@ -1209,7 +2333,11 @@ async def process_add_game_type(message: types.Message, state: FSMContext):
     date = data['game_date']
     name = message.text
 
-    execute_query("INSERT INTO games (game_date, game_name) VALUES (%s, %s)", (date, name))
+    await execute_query_async(
+        "INSERT INTO games (game_date, game_name, game_on) VALUES (%s, %s, %s)",
+        (date, name, data.get('game_on') or database.parse_game_date(date))
+    )
+    invalidate_games_catalog()
     await message.answer(f"Игра '{date} {name}' успешно добавлена!", reply_markup=admin_menu_keyboard())
     await state.set_state(Form.admin_menu)
 
@@ -1219,10 +2347,11 @@ async def delete_game_handler(message: types.Message, state: FSMContext):
         await message.answer("Ты вернулся в админ-меню", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
-    result = execute_query("SELECT game_id FROM games WHERE game_name || ' ' || game_date = %s AND is_deleted = FALSE", (message.text,), fetchone=True)
+    result = await find_game_by_label(message.text)
     if result:
         game_id = result[0]
-        execute_query("UPDATE games SET is_deleted = TRUE WHERE game_id = %s", (game_id,))
+        await execute_query_async("UPDATE games SET is_deleted = TRUE WHERE game_id = %s", (game_id,))
+        invalidate_games_catalog()
         await message.answer(f"Игра '{message.text}' удалена. Ты можешь восстановить её через меню восстановления.", reply_markup=admin_menu_keyboard())
     else:
         await message.answer("Игра не найдена.", reply_markup=admin_menu_keyboard())
@@ -1234,10 +2363,11 @@ async def restore_game_handler(message: types.Message, state: FSMContext):
         await message.answer("Ты вернулся в админ-меню", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
-    result = execute_query("SELECT game_id FROM games WHERE game_name || ' ' || game_date = %s AND is_deleted = TRUE", (message.text,), fetchone=True)
+    result = await find_game_by_label(message.text, is_deleted=True)
     if result:
         game_id = result[0]
-        execute_query("UPDATE games SET is_deleted = FALSE WHERE game_id = %s", (game_id,))
+        await execute_query_async("UPDATE games SET is_deleted = FALSE WHERE game_id = %s", (game_id,))
+        invalidate_games_catalog()
         await message.answer(f"Игра '{message.text}' успешно восстановлена вместе со всеми участниками!", reply_markup=admin_menu_keyboard())
     else:
         await message.answer("Игра не найдена.", reply_markup=admin_menu_keyboard())
@@ -1251,13 +2381,8 @@ async def admin_view_participants_handler(message: types.Message, state: FSMCont
         await state.set_state(Form.admin_menu)
         return
 
-    # Текст кнопки = "date name", поэтому ищем так же
     clean_text = message.text.replace("📅", "").strip() if message.text else ""
-    result = execute_query(
-        "SELECT game_id FROM games WHERE game_date || ' ' || game_name = %s OR game_name || ' ' || game_date = %s",
-        (clean_text, clean_text),
-        fetchone=True
-    )
+    result = await find_game_by_label(clean_text, is_deleted=None)
 
     if not result:
         await message.answer("Игра не найдена.", reply_markup=admin_menu_keyboard())
@@ -1309,16 +2434,7 @@ async def admin_manual_register_game_handler(message: types.Message, state: FSMC
         await state.set_state(Form.admin_menu)
         return
 
-    selected = execute_query(
-        """
-        SELECT game_id, game_name, game_date
-        FROM games
-        WHERE is_deleted = FALSE
-          AND (game_date || ' ' || game_name = %s OR game_name || ' ' || game_date = %s)
-        """,
-        (message.text, message.text),
-        fetchone=True
-    )
+    selected = await find_game_by_label(message.text)
     if not selected:
         await message.answer("Игра не найдена. Выберите игру кнопкой.")
         return
@@ -1343,7 +2459,7 @@ async def admin_manual_register_source_handler(message: types.Message, state: FS
         return
 
     if message.text == "👥Выбрать из базы":
-        users = execute_query(
+        users = await execute_query_async(
             """
             SELECT user_id, first_name, last_name, mafia_nick
             FROM users
@@ -1416,8 +2532,8 @@ async def admin_manual_register_nick_handler(message: types.Message, state: FSMC
     await state.update_data(manual_nick=message.text.strip())
     data = await state.get_data()
     platform = PLATFORM_TELEGRAM
-    platform_user_id = next_platform_user_id(PLATFORM_TELEGRAM)
-    upsert_user(
+    platform_user_id = await next_manual_player_id()
+    await upsert_user(
         platform=platform,
         platform_user_id=platform_user_id,
         first_name=data.get("manual_first_name"),
@@ -1455,23 +2571,25 @@ async def admin_manual_register_action_handler(message: types.Message, state: FS
         return
 
     if message.text == "✅Записать игрока":
-        execute_query(
+        await execute_query_async(
             """
             INSERT INTO registrations (user_id, game_id, status)
             VALUES (%s, %s, 'registered')
             ON CONFLICT (user_id, game_id)
-            DO UPDATE SET status = 'registered', is_late = FALSE
+            DO UPDATE SET status = 'registered', is_late = FALSE,
+                registered_at = CASE WHEN registrations.status = 'registered' THEN registrations.registered_at ELSE NOW() END
             """,
             (target_user_id, game_id)
         )
-        execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (target_user_id, game_id))
+        await execute_query_async("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (target_user_id, game_id))
+        invalidate_participants_cache(game_id)
         await unmark_late(target_user_id, game_id)
         await message.answer(f"Игрок записан на игру {game_title}.", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
 
     if message.text == "❌Отменить запись игрока":
-        execute_query(
+        await execute_query_async(
             """
             INSERT INTO registrations (user_id, game_id, status)
             VALUES (%s, %s, 'declined')
@@ -1480,30 +2598,33 @@ async def admin_manual_register_action_handler(message: types.Message, state: FS
             """,
             (target_user_id, game_id)
         )
-        execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (target_user_id, game_id))
+        await execute_query_async("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (target_user_id, game_id))
+        invalidate_participants_cache(game_id)
         await unmark_late(target_user_id, game_id)
         await message.answer(f"Запись игрока на игру {game_title} отменена.", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
 
     if message.text == "⏰Отметить опоздание":
-        execute_query(
+        await execute_query_async(
             """
             INSERT INTO registrations (user_id, game_id, status)
             VALUES (%s, %s, 'registered')
             ON CONFLICT (user_id, game_id)
-            DO UPDATE SET status = 'registered'
+            DO UPDATE SET status = 'registered',
+                registered_at = CASE WHEN registrations.status = 'registered' THEN registrations.registered_at ELSE NOW() END
             """,
             (target_user_id, game_id)
         )
-        execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (target_user_id, game_id))
+        await execute_query_async("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (target_user_id, game_id))
+        invalidate_participants_cache(game_id)
         await mark_late(target_user_id, game_id)
         await message.answer(f"Для игрока отмечено опоздание на игру {game_title}.", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
 
     if message.text == "🤔Отметить думает":
-        execute_query(
+        await execute_query_async(
             """
             INSERT INTO registrations (user_id, game_id, status)
             VALUES (%s, %s, 'declined')
@@ -1512,6 +2633,7 @@ async def admin_manual_register_action_handler(message: types.Message, state: FS
             """,
             (target_user_id, game_id)
         )
+        invalidate_participants_cache(game_id)
         await unmark_late(target_user_id, game_id)
         await mark_thinking(target_user_id, game_id)
         await message.answer(f"Для игрока отмечен статус «думает» на игру {game_title}.", reply_markup=admin_menu_keyboard())
@@ -1523,50 +2645,29 @@ async def admin_manual_register_action_handler(message: types.Message, state: FS
 @dp.message(Form.menu)
 async def menu_handler(message: types.Message, state: FSMContext):
     if message.text == "📝Записаться на игру":
-        games = sort_games_by_date(filter_upcoming_games(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True)))
+        games = await fetch_upcoming_games()
         if not games:
             await message.answer("К сожалению, на данный момент игр для записи нет.", reply_markup=main_menu_keyboard(message.from_user.id))
             return
 
-        builder = InlineKeyboardBuilder()
-        for game_id, name, date in games:
-            display_name = name
-            if "Спортивная мафия" in name and "🌃" not in name:
-                display_name = name.replace("🏆", "🌃")
-            builder.button(text=f"📆{date} {display_name}", callback_data=f"reg_{game_id}")
-        builder.button(text="🔙В меню", callback_data="menu_back")
-        builder.adjust(1)
-
-        await message.answer("На какую игру ты хочешь записаться?", reply_markup=builder.as_markup())
+        await message.answer("На какую игру ты хочешь записаться?", reply_markup=games_inline_keyboard(games, "reg_"))
         await state.set_state(Form.menu)
     elif message.text == "❌Отменить запись":
         internal_user_id = telegram_internal_user_id(message.from_user)
-        games = execute_query("""
-            SELECT g.game_id, g.game_name, g.game_date 
+        games = await execute_query_async("""
+            SELECT g.game_id, g.game_name, g.game_date
             FROM registrations r
             JOIN games g ON r.game_id=g.game_id
-            WHERE r.user_id=%s
-        """, (internal_user_id,), fetch=True)
-        games = sort_games_by_date(filter_upcoming_games(games))
+            WHERE r.user_id=%s AND (g.game_on IS NULL OR g.game_on >= %s)
+            ORDER BY g.game_on NULLS LAST, g.game_date
+        """, (internal_user_id, datetime.date.today()), fetch=True)
         if not games:
             await message.answer("Ты пока не записан ни на какую игру.", reply_markup=main_menu_keyboard(message.from_user.id))
             return
-        builder = InlineKeyboardBuilder()
-        for game_id, name, date in games:
-            display_name = name
-            if "Спортивная мафия" in name and "🌃" not in name:
-                display_name = name.replace("🏆", "🌃")
-            builder.button(text=f"📆{date} {display_name}", callback_data=f"cancel_{game_id}")
-        builder.button(text="🔙В меню", callback_data="menu_back")
-        builder.adjust(1)
-
-        await message.answer("Запись на какую игру ты хочешь отменить?", reply_markup=builder.as_markup())
+        await message.answer("Запись на какую игру ты хочешь отменить?", reply_markup=games_inline_keyboard(games, "cancel_"))
         await state.set_state(Form.menu)
     elif message.text == "📅Расписание игр":
-        games = sort_games_by_date(
-            [g for g in execute_query("SELECT game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True) if is_upcoming_game(g[1])],
-            date_index=1
-        )
+        games = [(name, date) for _, name, date in await fetch_upcoming_games()]
         if not games:
             await message.answer("<b>Расписание ближайших игр:</b>\n\nИгр пока не запланировано.", parse_mode="HTML")
             return
@@ -1586,69 +2687,28 @@ async def menu_handler(message: types.Message, state: FSMContext):
             parse_mode="HTML"
         )
     elif message.text == "👥Список участников":
-        games = sort_games_by_date(filter_upcoming_games(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True)))
+        games = await fetch_upcoming_games()
         if not games:
             await message.answer("К сожалению, на данный момент игр нет.", reply_markup=main_menu_keyboard(message.from_user.id))
             return
 
-        builder = InlineKeyboardBuilder()
-        for game_id, name, date in games:
-            display_name = name
-            if "Спортивная мафия" in name and "🌃" not in name:
-                display_name = name.replace("🏆", "🌃")
-            builder.button(text=f"📅{date} {display_name}", callback_data=f"participants_{game_id}")
-        builder.button(text="🔙В меню", callback_data="menu_back")
-        builder.adjust(1)
-
-        await message.answer("Список участников какой игры ты хочешь посмотреть?", reply_markup=builder.as_markup())
+        await message.answer("Список участников какой игры ты хочешь посмотреть?", reply_markup=games_inline_keyboard(games, "participants_", icon="📅"))
         await state.set_state(Form.menu)
 
 @dp.callback_query(F.data.startswith("participants_"))
 async def callback_participants(callback: types.CallbackQuery, state: FSMContext):
     game_id = int(callback.data.split("_")[1])
 
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s AND is_deleted = FALSE", (game_id,), fetchone=True)
+    game = await get_game_info(game_id, active_only=True)
     if not game:
         await callback.answer("Игра не найдена.", show_alert=True)
         return
 
     game_name, game_date = game
 
-    participants = execute_query("""
-        SELECT u.user_id, u.mafia_nick
-        FROM registrations r
-        JOIN users u ON r.user_id = u.user_id
-        WHERE r.game_id = %s
-            AND r.status = %s
-    """, (game_id,'registered'), fetch=True)
-
-    thinking_users = await get_thinking(game_id)
-    thinking_users = set(map(int, thinking_users))
-    late_users = await get_late_players(game_id)
-
     title = f"📅{game_date} {game_name}"
-    if not participants and not thinking_users:
-        await callback.message.answer(f"На игру {title} пока никто не записался.", reply_markup=main_menu_keyboard(callback.from_user.id))
-    else:
-        response = f"Список участников на игру {title}:\n"
-        participant_ids = {uid for uid, _ in participants}
-        regular_participants = [p for p in participants if p[0] not in late_users]
-        late_participants = [p for p in participants if p[0] in late_users]
-
-        idx = 1
-        for uid, nick in regular_participants + late_participants:
-            mark = " (думает)" if uid in thinking_users else ""
-            late_mark = " (опоздает)" if uid in late_users else ""
-            response += f"{idx}. {nick}{mark}{late_mark}\n"
-            idx += 1
-
-        for uid in thinking_users:
-            if uid not in participant_ids:
-                ud = execute_query("SELECT mafia_nick FROM users WHERE user_id=%s", (uid,), fetchone=True)
-                if ud:
-                    response += f"- {ud[0]} (думает)\n"
-
-        await callback.message.answer(response, reply_markup=main_menu_keyboard(callback.from_user.id))
+    response = await format_user_participants_async(game_id, title)
+    await callback.message.answer(response, reply_markup=main_menu_keyboard(callback.from_user.id))
 
     await callback.answer()
     await callback.message.edit_reply_markup(reply_markup=None)
@@ -1666,16 +2726,14 @@ async def callback_cancel(callback: types.CallbackQuery, state: FSMContext):
     game_id = int(callback.data.split("_")[1])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s", (game_id,), fetchone=True)
+    game = await get_game_info(game_id)
     if not game:
         await callback.answer("Игра не найдена.", show_alert=True)
         return
 
     game_name, game_date = game
 
-    execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (user_id, game_id))
-    await unmark_late(user_id, game_id)
-    execute_query("DELETE FROM registrations WHERE user_id=%s AND game_id=%s", (user_id, game_id))
+    await cancel_user_registration(user_id, game_id)
 
     await callback.message.answer(
         "Запись отменена.\n"
@@ -1685,7 +2743,7 @@ async def callback_cancel(callback: types.CallbackQuery, state: FSMContext):
         parse_mode="HTML"
     )
 
-    ud = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (user_id,), fetchone=True)
+    ud = await get_user_names(user_id)
     if ud:
         await notify_admin(f"❌Отмена записи: {ud[0]} {ud[1]} ({ud[2]}) на {game_date} {game_name}")
 
@@ -1699,45 +2757,11 @@ async def user_view_participants_handler(message: types.Message, state: FSMConte
         await message.answer("Ты вернулся в меню.", reply_markup=main_menu_keyboard(message.from_user.id))
         await state.set_state(Form.menu)
         return
-    clean_text = message.text.replace("📅", "").strip() if message.text else ""
-    result = execute_query("SELECT game_id FROM games WHERE game_date || ' ' || game_name = %s OR game_name || ' ' || game_date = %s", (clean_text, clean_text), fetchone=True)
+    result = await find_game_by_label(message.text, is_deleted=None)
     if result:
         game_id = result[0]
-        participants = execute_query("""
-            SELECT u.user_id, u.mafia_nick
-            FROM registrations r
-            JOIN users u ON r.user_id = u.user_id
-            WHERE r.game_id = %s
-                AND r.status = %s
-        """, (game_id,'registered'), fetch=True)
-
-        # Получаем думающих через Redis
-        thinking_users = await get_thinking(game_id)
-        thinking_users = set(map(int, thinking_users))
-        late_users = await get_late_players(game_id)
-
-        if not participants and not thinking_users:
-            await message.answer(f"На игру {message.text} пока никто не записался.", reply_markup=main_menu_keyboard(message.from_user.id))
-        else:
-            response = f"Список участников на игру {message.text}:\n"
-            regular_participants = [p for p in participants if p[0] not in late_users]
-            late_participants = [p for p in participants if p[0] in late_users]
-            participant_ids = {uid for uid, _ in participants}
-            idx = 1
-            for uid, nick in regular_participants + late_participants:
-                mark = " (думает)" if uid in thinking_users else ""
-                late_mark = " (опоздает)" if uid in late_users else ""
-                response += f"{idx}. {nick}{mark}{late_mark}\n"
-                idx += 1
-
-            for uid in thinking_users:
-                # Проверяем, что не в списке основных
-                if uid not in participant_ids:
-                    ud = execute_query("SELECT mafia_nick FROM users WHERE user_id=%s", (uid,), fetchone=True)
-                    if ud:
-                        response += f"- {ud[0]} (думает)\n"
-
-            await message.answer(response, reply_markup=main_menu_keyboard(message.from_user.id))
+        response = await format_user_participants_async(game_id, message.text)
+        await message.answer(response, reply_markup=main_menu_keyboard(message.from_user.id))
     else:
         await message.answer("Игра не найдена.", reply_markup=main_menu_keyboard(message.from_user.id))
     await state.set_state(Form.menu)
@@ -1749,32 +2773,21 @@ async def register_game(message: types.Message, state: FSMContext):
         await state.set_state(Form.menu)
         return
     internal_user_id = telegram_internal_user_id(message.from_user)
-    clean_text = message.text.replace("📆", "").strip() if message.text else ""
-    result = execute_query(
-        """
-        SELECT game_id, game_name, game_date
-        FROM games
-        WHERE is_deleted = FALSE
-          AND %s LIKE '%' || game_date || '%'
-          AND (
-              %s LIKE '%' || game_name || '%'
-              OR %s LIKE '%' || REPLACE(game_name, '🏆', '🌃') || '%'
-          )
-        """,
-        (clean_text, clean_text, clean_text),
-        fetchone=True
-        )
+    result = await find_game_by_label(message.text)
     if result:
-        game_id, game_name, game_date = result
-        user_age_row = execute_query("SELECT age FROM users WHERE user_id = %s", (internal_user_id,), fetchone=True)
-        user_age = user_age_row[0] if user_age_row else None
-        age_rejection = get_registration_age_rejection(game_name, user_age)
-        if age_rejection:
-            await message.answer(age_rejection, reply_markup=main_menu_keyboard(message.from_user.id))
+        game_id = result[0]
+        registration = await register_user_for_game_async(internal_user_id, game_id, active_only=True)
+        if registration.status == REGISTRATION_GAME_NOT_FOUND:
+            await message.answer("Не удалось найти выбранную игру. Попробуй выбрать её из списка ещё раз.", reply_markup=main_menu_keyboard(message.from_user.id))
             await state.set_state(Form.menu)
             return
 
-        if await is_game_full(game_id, game_name, internal_user_id):
+        if registration.status == REGISTRATION_AGE_REJECTED:
+            await message.answer(registration.age_rejection, reply_markup=main_menu_keyboard(message.from_user.id))
+            await state.set_state(Form.menu)
+            return
+
+        if registration.status == REGISTRATION_GAME_FULL:
             await message.answer(
                 "К сожалению, на данную игру записалось максимальное количество участников😢\n"
                 "Попробуй записаться на другую игру или напиши Нате @natabordo, возможно она сможет что-то придумать☺️",
@@ -1783,21 +2796,12 @@ async def register_game(message: types.Message, state: FSMContext):
             await state.set_state(Form.menu)
             return
 
-        # Удаляем из списка думающих при регистрации
-        execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (internal_user_id, game_id))
-        execute_query("""
-            INSERT INTO registrations (user_id, game_id, status, is_late)
-            VALUES (%s, %s, 'registered', FALSE)
-            ON CONFLICT (user_id, game_id)
-            DO UPDATE SET status = 'registered', is_late = FALSE
-        """, (internal_user_id, game_id))
         await message.answer(
-            build_registration_success_text(game_date, game_name),
+            build_registration_success_text(registration.game_date, registration.game_name),
             reply_markup=late_button_keyboard(game_id)
         )
-        ud = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
-        if ud:
-            await notify_admin(f"Новая запись: {ud[0]} {ud[1]} ({ud[2]}) на {message.text}")
+        if registration.has_profile:
+            await notify_admin(f"Новая запись: {registration.first_name} {registration.last_name} ({registration.mafia_nick}) на {message.text}")
     else:
         await message.answer("Не удалось найти выбранную игру. Попробуй выбрать её из списка ещё раз.", reply_markup=main_menu_keyboard(message.from_user.id))
     await state.set_state(Form.menu)
@@ -1809,34 +2813,18 @@ async def cancel_game(message: types.Message, state: FSMContext):
         await state.set_state(Form.menu)
         return
     internal_user_id = telegram_internal_user_id(message.from_user)
-    clean_text = message.text.replace("📆", "").strip() if message.text else ""
-    result = execute_query(
-        """
-        SELECT game_id
-        FROM games
-        WHERE is_deleted = FALSE
-          AND (
-              game_date || ' ' || game_name = %s
-              OR game_name || ' ' || game_date = %s
-              OR game_date || ' ' || REPLACE(game_name, '🏆', '🌃') = %s
-          )
-        """,
-        (clean_text, clean_text, clean_text),
-        fetchone=True
-    )
+    result = await find_game_by_label(message.text)
     if result:
         game_id = result[0]
         # Удаляем из всех списков
-        execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (internal_user_id, game_id))
-        await unmark_late(internal_user_id, game_id)
-        execute_query("DELETE FROM registrations WHERE user_id=%s AND game_id=%s", (internal_user_id, game_id))
+        await cancel_user_registration(internal_user_id, game_id)
         await message.answer("Запись отменена.\n"
                              "Спасибо за то, что уважаешь клуб и других игроков!☺️\n"
                              "Будем ждать тебя на следующих играх.",
                              reply_markup=main_menu_keyboard(message.from_user.id),
                              parse_mode="HTML"
                             )
-        ud = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
+        ud = await get_user_names(internal_user_id)
         if ud:
             await notify_admin(f"❌Отмена записи: {ud[0]} {ud[1]} ({ud[2]}) на {message.text}")
     else:
@@ -1849,27 +2837,19 @@ async def callback_thinking_reminder_yes(callback: types.CallbackQuery, state: F
     game_id = int(callback.data.split("_")[2])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    game = execute_query(
-        "SELECT game_name, game_date FROM games WHERE game_id = %s",
-        (game_id,),
-        fetchone=True
-    )
-    if not game:
+    registration = await register_user_for_game_async(user_id, game_id)
+    if registration.status == REGISTRATION_GAME_NOT_FOUND:
         await callback.answer("Игра не найдена.", show_alert=True)
         return
 
-    game_name, game_date = game
-    user_age_row = execute_query("SELECT age FROM users WHERE user_id = %s", (user_id,), fetchone=True)
-    user_age = user_age_row[0] if user_age_row else None
-    age_rejection = get_registration_age_rejection(game_name, user_age)
-    if age_rejection:
-        await callback.message.answer(age_rejection, reply_markup=main_menu_keyboard(callback.from_user.id))
+    if registration.status == REGISTRATION_AGE_REJECTED:
+        await callback.message.answer(registration.age_rejection, reply_markup=main_menu_keyboard(callback.from_user.id))
         await callback.answer("Возрастное ограничение", show_alert=True)
         await callback.message.edit_reply_markup(reply_markup=None)
         await state.set_state(Form.menu)
         return
 
-    if await is_game_full(game_id, game_name, user_id):
+    if registration.status == REGISTRATION_GAME_FULL:
         await callback.message.answer(
             "К сожалению, на данную игру записалось максимальное количество участников😢\n"
             "Попробуй записаться на другую игру или напиши Нате @natabordo, возможно она сможет что-то придумать☺️",
@@ -1880,16 +2860,7 @@ async def callback_thinking_reminder_yes(callback: types.CallbackQuery, state: F
         await state.set_state(Form.menu)
         return
 
-    execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (user_id, game_id))
-    execute_query(
-        """
-        INSERT INTO registrations (user_id, game_id, status, is_late)
-        VALUES (%s, %s, 'registered', FALSE)
-        ON CONFLICT (user_id, game_id)
-        DO UPDATE SET status = 'registered', is_late = FALSE
-        """,
-        (user_id, game_id)
-    )
+    game_name, game_date = registration.game_name, registration.game_date
 
     await callback.message.answer(
         build_registration_success_text(game_date, game_name),
@@ -1899,13 +2870,8 @@ async def callback_thinking_reminder_yes(callback: types.CallbackQuery, state: F
     await callback.message.edit_reply_markup(reply_markup=None)
     await state.set_state(Form.menu)
 
-    ud = execute_query(
-        "SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s",
-        (user_id,),
-        fetchone=True
-    )
-    if ud:
-        await notify_admin(f"Новая запись: {ud[0]} {ud[1]} ({ud[2]}) на {game_date} {game_name}")
+    if registration.has_profile:
+        await notify_admin(f"Новая запись: {registration.first_name} {registration.last_name} ({registration.mafia_nick}) на {game_date} {game_name}")
 
 
 @dp.callback_query(F.data.startswith("thinkrem_no_"))
@@ -1932,7 +2898,7 @@ async def callback_think(callback: types.CallbackQuery):
     game_id = int(callback.data.split("_")[1])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s", (game_id,), fetchone=True)
+    game = await get_game_info(game_id)
 
     if not game:
         await callback.answer("Игра не найдена.", show_alert=True)
@@ -1945,7 +2911,7 @@ async def callback_think(callback: types.CallbackQuery):
     await callback.message.edit_reply_markup(reply_markup=None)
 
     # Notify admin
-    ud = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (user_id,), fetchone=True)
+    ud = await get_user_names(user_id)
     if ud:
         await notify_admin(f"🤔Игрок думает: {ud[0]} {ud[1]} ({ud[2]}) на {game[1]} {game[0]}")
 
@@ -1954,28 +2920,19 @@ async def callback_reg(callback: types.CallbackQuery, state: FSMContext):
     game_id = int(callback.data.split("_")[1])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    game = execute_query(
-        "SELECT game_name, game_date FROM games WHERE game_id = %s",
-        (game_id,),
-        fetchone=True
-    )
-
-    if not game:
+    registration = await register_user_for_game_async(user_id, game_id)
+    if registration.status == REGISTRATION_GAME_NOT_FOUND:
         await callback.answer("Игра не найдена.", show_alert=True)
         return
 
-    game_name, game_date = game
-    user_age_row = execute_query("SELECT age FROM users WHERE user_id = %s", (user_id,), fetchone=True)
-    user_age = user_age_row[0] if user_age_row else None
-    age_rejection = get_registration_age_rejection(game_name, user_age)
-    if age_rejection:
-        await callback.message.answer(age_rejection, reply_markup=main_menu_keyboard(callback.from_user.id))
+    if registration.status == REGISTRATION_AGE_REJECTED:
+        await callback.message.answer(registration.age_rejection, reply_markup=main_menu_keyboard(callback.from_user.id))
         await callback.answer("Возрастное ограничение", show_alert=True)
         await callback.message.edit_reply_markup(reply_markup=None)
         await state.set_state(Form.menu)
         return
 
-    if await is_game_full(game_id, game_name, user_id):
+    if registration.status == REGISTRATION_GAME_FULL:
         await callback.message.answer(
             "К сожалению, на данную игру записалось максимальное количество участников😢\n"
             "Попробуй записаться на другую игру или напиши Нате @natabordo, возможно она сможет что-то придумать☺️",
@@ -1986,19 +2943,7 @@ async def callback_reg(callback: types.CallbackQuery, state: FSMContext):
         await state.set_state(Form.menu)
         return
 
-    # Удаляем из списка думающих
-    execute_query(
-        "DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s",
-        (user_id, game_id)
-    )
-
-    # Регистрируем или обновляем статус
-    execute_query("""
-        INSERT INTO registrations (user_id, game_id, status, is_late)
-        VALUES (%s, %s, 'registered', FALSE)
-        ON CONFLICT (user_id, game_id)
-        DO UPDATE SET status = 'registered', is_late = FALSE
-    """, (user_id, game_id))
+    game_name, game_date = registration.game_name, registration.game_date
 
     await callback.message.answer(
         build_registration_success_text(game_date, game_name),
@@ -2010,21 +2955,15 @@ async def callback_reg(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(Form.menu)
 
     # Уведомление админу
-    ud = execute_query(
-        "SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s",
-        (user_id,),
-        fetchone=True
-    )
-
-    if ud:
-        await notify_admin(f"Новая запись: {ud[0]} {ud[1]} ({ud[2]}) на {game_date} {game_name}")
+    if registration.has_profile:
+        await notify_admin(f"Новая запись: {registration.first_name} {registration.last_name} ({registration.mafia_nick}) на {game_date} {game_name}")
 
 @dp.callback_query(F.data.startswith("late_"))
 async def callback_late(callback: types.CallbackQuery):
     game_id = int(callback.data.split("_")[1])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    reg = execute_query(
+    reg = await execute_query_async(
         "SELECT 1 FROM registrations WHERE user_id=%s AND game_id=%s AND status='registered'",
         (user_id, game_id),
         fetchone=True
@@ -2037,8 +2976,8 @@ async def callback_late(callback: types.CallbackQuery):
     await callback.answer("Отметили, что вы опоздаете⏰")
     await callback.message.edit_reply_markup(reply_markup=None)
 
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s", (game_id,), fetchone=True)
-    ud = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (user_id,), fetchone=True)
+    game = await get_game_info(game_id)
+    ud = await get_user_names(user_id)
     if game and ud:
         await notify_admin(f"⏰Опоздает: {ud[0]} {ud[1]} ({ud[2]}) на {game[1]} {game[0]}")
 
@@ -2047,22 +2986,19 @@ async def callback_decline(callback: types.CallbackQuery):
     game_id = int(callback.data.split("_")[1])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    execute_query("""
+    await execute_query_async("""
         INSERT INTO registrations (user_id, game_id, status)
         VALUES (%s, %s, 'declined')
         ON CONFLICT (user_id, game_id)
         DO UPDATE SET status = 'declined'
     """, (user_id, game_id))
+    invalidate_participants_cache(game_id)
     await unmark_late(user_id, game_id)
 
     await callback.answer("Спасибо за ответ!")
     await callback.message.edit_reply_markup(reply_markup=None)
 
-    ud = execute_query(
-        "SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s",
-        (user_id,),
-        fetchone=True
-    )
+    ud = await get_user_names(user_id)
 
     if ud:
         await notify_admin(f"❌Отказ от игры: {ud[0]} {ud[1]} ({ud[2]})")
@@ -2072,21 +3008,18 @@ async def callback_cancel_registration(callback: types.CallbackQuery):
     game_id = int(callback.data.split("_")[1])
     user_id = telegram_internal_user_id(callback.from_user)
 
-    execute_query("""
+    await execute_query_async("""
         UPDATE registrations
         SET status = 'declined'
         WHERE user_id=%s AND game_id=%s
     """, (user_id, game_id))
+    invalidate_participants_cache(game_id)
     await unmark_late(user_id, game_id)
 
     await callback.answer("Запись отменена!")
     await callback.message.edit_reply_markup(reply_markup=None)
 
-    ud = execute_query(
-        "SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s",
-        (user_id,),
-        fetchone=True
-    )
+    ud = await get_user_names(user_id)
 
     if ud:
         await notify_admin(f"❌Отмена записи: {ud[0]} {ud[1]} ({ud[2]})")
@@ -2097,19 +3030,19 @@ async def admin_cancel_game_handler(message: types.Message, state: FSMContext):
         await message.answer("Вы вернулись в админ-меню", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
-    result = execute_query("SELECT game_id, game_name, game_date FROM games WHERE game_date || ' ' || game_name = %s", (message.text,), fetchone=True)
+    result = await find_game_by_label(message.text, is_deleted=None)
     if result:
         game_id = result[0]
         game_info = message.text
-        participants = execute_query("SELECT user_id FROM registrations WHERE game_id = %s", (game_id,), fetch=True)
-        for (user_id,) in participants:
-            try:
-                await send_text_to_user(user_id, f"⚠️ Внимание! Отмена игры на {game_info}!⚠️")
-            except Exception as e:
-                logging.error(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
-        execute_query("DELETE FROM registrations WHERE game_id = %s", (game_id,))
-        execute_query("DELETE FROM games WHERE game_id = %s", (game_id,))
-        await message.answer(f"Игра '{game_info}' отменена. Игроки ({len(participants)} чел.) уведомлены.", reply_markup=admin_menu_keyboard())
+        participants = await execute_query_async("SELECT user_id FROM registrations WHERE game_id = %s", (game_id,), fetch=True)
+        await enqueue_campaign(
+            f"Уведомления об отмене игры {game_info}",
+            [OutboxMessage(user_id, f"⚠️ Внимание! Отмена игры на {game_info}!⚠️") for (user_id,) in participants],
+            requested_by=telegram_internal_user_id(message.from_user),
+            campaign_id=telegram_campaign_id(message)
+        )
+        await delete_game(game_id)
+        await message.answer(f"Игра '{game_info}' отменена. Уведомления игрокам ({len(participants)} чел.) поставлены в очередь.", reply_markup=admin_menu_keyboard())
     else:
         await message.answer("Игра не найдена.", reply_markup=admin_menu_keyboard())
     await state.set_state(Form.admin_menu)
@@ -2121,8 +3054,7 @@ async def admin_reminder_handler(message: types.Message, state: FSMContext):
         await state.set_state(Form.admin_menu)
         return
 
-    clean_text = message.text.replace("📆", "").strip() if message.text else ""
-    result = execute_query("SELECT game_id FROM games WHERE game_date || ' ' || game_name = %s OR '📆' || game_date || ' ' || game_name = %s OR game_date || ' ' || game_name = %s", (clean_text, message.text, message.text), fetchone=True)
+    result = await find_game_by_label(message.text, is_deleted=None)
 
     if result:
         await state.update_data(reminder_game_id=result[0], reminder_game_text=message.text)
@@ -2146,34 +3078,25 @@ async def admin_get_announcement_handler(message: types.Message, state: FSMConte
         await state.set_state(Form.admin_menu)
         return
 
-    result = execute_query(
-        "SELECT game_name, game_date FROM games WHERE game_date || ' ' || game_name = %s AND is_deleted = FALSE",
-        (message.text,),
-        fetchone=True
-    )
+    result = await find_game_by_label(message.text)
     if not result:
         await message.answer("Игра не найдена. Попробуйте выбрать игру из списка еще раз.")
         return
 
-    game_name, game_date = result
+    _, game_name, game_date = result
     await message.answer(build_admin_announcement_text(game_date, game_name), reply_markup=admin_menu_keyboard())
     await state.set_state(Form.admin_menu)
 
 @dp.message(Form.admin_reminder_audience)
 async def admin_reminder_audience_handler(message: types.Message, state: FSMContext):
     if message.text == "🔙Назад":
-        games = sort_games_by_date(execute_query("SELECT game_id, game_name, game_date FROM games", fetch=True))
+        games = [game[:3] for game in await fetch_active_games(include_deleted=True)]
         if not games:
             await message.answer("Список игр пуст.", reply_markup=admin_menu_keyboard())
             await state.set_state(Form.admin_menu)
             return
 
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру, о которой нужно напомнить:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру, о которой нужно напомнить:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.admin_reminder)
         return
 
@@ -2182,27 +3105,33 @@ async def admin_reminder_audience_handler(message: types.Message, state: FSMCont
 
     target_users = []
     if message.text == "👥Всем пользователям":
-        rows = execute_query("SELECT user_id FROM users", fetch=True)
+        rows = await execute_query_async("SELECT user_id FROM users WHERE unreachable_since IS NULL", fetch=True)
         target_users = [r[0] for r in rows]
     elif message.text == "✅Только записавшимся":
-        rows = execute_query("SELECT user_id FROM registrations WHERE game_id = %s", (game_id,), fetch=True)
+        rows = await execute_query_async(REMINDER_REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
         target_users = [r[0] for r in rows]
     elif message.text == "❌Только не записавшимся":
-        rows = execute_query("SELECT user_id FROM users WHERE user_id NOT IN (SELECT user_id FROM registrations WHERE game_id = %s)", (game_id,), fetch=True)
+        rows = await execute_query_async(REMINDER_NOT_REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
         target_users = [r[0] for r in rows]
     elif message.text == "🤔Думающим игрокам":
-        rows = execute_query("SELECT user_id FROM thinking_players WHERE game_id = %s", (game_id,), fetch=True)
+        rows = await execute_query_async(THINKING_AUDIENCE_QUERY, (game_id,), fetch=True)
         target_users = [r[0] for r in rows]
         if not target_users:
             await message.answer("Нет думающих игроков для этой игры.", reply_markup=admin_menu_keyboard())
             await state.set_state(Form.admin_menu)
             return
-        count = await send_game_reminders(target_users, game_id, thinking_decision=True)
-        await message.answer(f"Напоминания отправлены {count} думающим игрокам.", reply_markup=admin_menu_keyboard())
+        count = await send_game_reminders(
+            target_users,
+            game_id,
+            thinking_decision=True,
+            requested_by=telegram_internal_user_id(message.from_user),
+            campaign_id=telegram_campaign_id(message)
+        )
+        await message.answer(f"Напоминания для {count} думающих игроков поставлены в очередь. Итог пришлю, когда отправка завершится.", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         return
     elif message.text in {"👤Выбрать пользователей", "👤Выбор пользователей"}:
-        users = execute_query("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
+        users = await execute_query_async("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
         if not users:
             await message.answer("Пользователей не найдено.")
             return
@@ -2227,8 +3156,13 @@ async def admin_reminder_audience_handler(message: types.Message, state: FSMCont
         await state.set_state(Form.admin_menu)
         return
 
-    count = await send_game_reminders(target_users, game_id)
-    await message.answer(f"Напоминания отправлены {count} пользователям.", reply_markup=admin_menu_keyboard())
+    count = await send_game_reminders(
+        target_users,
+        game_id,
+        requested_by=telegram_internal_user_id(message.from_user),
+        campaign_id=telegram_campaign_id(message)
+    )
+    await message.answer(f"Напоминания для {count} пользователей поставлены в очередь. Итог пришлю, когда отправка завершится.", reply_markup=admin_menu_keyboard())
     await state.set_state(Form.admin_menu)
 
 @dp.callback_query(Form.admin_reminder_custom_users, F.data.startswith("seluser_"))
@@ -2245,8 +3179,13 @@ async def process_user_selection(callback: types.CallbackQuery, state: FSMContex
             return
 
         game_id = data.get('reminder_game_id')
-        count = await send_game_reminders(selected, game_id)
-        await callback.message.edit_text(f"Напоминания отправлены {count} выбранным пользователям.")
+        count = await send_game_reminders(
+            selected,
+            game_id,
+            requested_by=telegram_internal_user_id(callback.from_user),
+            campaign_id=telegram_campaign_id(callback)
+        )
+        await callback.message.edit_text(f"Напоминания для {count} выбранных пользователей поставлены в очередь. Итог пришлю, когда отправка завершится.")
         await callback.message.answer("Возвращаюсь в админ-меню.", reply_markup=admin_menu_keyboard())
         await state.set_state(Form.admin_menu)
         await callback.answer()
@@ -2271,82 +3210,70 @@ async def process_user_selection(callback: types.CallbackQuery, state: FSMContex
 
     await callback.message.edit_reply_markup(reply_markup=builder.as_markup())
 
-async def send_game_reminders(user_ids, game_id, thinking_decision: bool = False):
-    count = 0
-
-    game_data = execute_query(
-        "SELECT game_name, game_date FROM games WHERE game_id = %s",
-        (game_id,),
-        fetchone=True
-    )
+async def send_game_reminders(
+    user_ids,
+    game_id,
+    thinking_decision: bool = False,
+    requested_by: int = None,
+    campaign_id: str = None,
+):
+    game_data = await get_game_info(game_id)
 
     if not game_data:
         return 0
 
     g_name, g_date = game_data
+    user_ids = list(dict.fromkeys(user_ids))
+    # Статусы всей аудитории одним запросом, дальше только сборка сообщений
+    statuses = dict(await execute_query_async(
+        "SELECT user_id, status FROM registrations WHERE game_id = %s AND user_id = ANY(%s)",
+        (game_id, user_ids),
+        fetch=True
+    ))
+    messages = []
 
     for uid in user_ids:
-        try:
-            row = execute_query(
-                "SELECT status FROM registrations WHERE user_id=%s AND game_id=%s",
-                (uid, game_id),
-                fetchone=True
-            )
-
-            if thinking_decision:
-                if detect_platform_by_user_id(uid) == PLATFORM_TELEGRAM:
-                    await bot.send_message(
-                        get_platform_user_id(uid),
-                        f"Привет! Пора определиться, пойдешь играть? *{g_date} {g_name}*\n{get_game_rules(g_name, g_date).strip()}",
-                        parse_mode="Markdown",
-                        reply_markup=thinking_reminder_keyboard(game_id)
-                    )
-                else:
-                    await send_text_to_user(
-                        uid,
-                        f"Привет! Пора определиться, пойдешь играть? *{g_date} {g_name}*\n{get_game_rules(g_name, g_date).strip()}",
-                        reply_markup=vk_thinking_reminder_actions_keyboard(game_id)
-                    )
-                count += 1
-                continue
-
-            # Если пользователь отказался — не шлём повторно
-            if row and row[0] == "declined":
-                continue
-
-            builder = InlineKeyboardBuilder()
-
-            if row and row[0] == "registered":
-                builder.button(
-                    text="❌Отменить запись",
-                    callback_data=f"cancelreg_{game_id}"
-                )
-                builder.button(text="⏰Опоздаю", callback_data=f"late_{game_id}")
-            else:
-                builder.button(text="📝Записаться", callback_data=f"reg_{game_id}")
-                builder.button(text="🤔Думаю", callback_data=f"think_{game_id}")
-                builder.button(text="❌Не приду", callback_data=f"decline_{game_id}")
-                builder.adjust(2)
+        status = statuses.get(uid)
 
+        if thinking_decision:
             if detect_platform_by_user_id(uid) == PLATFORM_TELEGRAM:
-                await bot.send_message(
-                    get_platform_user_id(uid),
-                    f"🔔Напоминание об игре: {g_date} {g_name}\n{get_game_rules(g_name, g_date).strip()}\nБудем вас ждать!😊",
-                    reply_markup=builder.as_markup()
-                )
+                messages.append(OutboxMessage(
+                    uid,
+                    f"Привет! Пора определиться, пойдешь играть? *{g_date} {g_name}*\n{get_game_rules(g_name, g_date).strip()}",
+                    parse_mode="Markdown",
+                    reply_markup=thinking_reminder_keyboard(game_id)
+                ))
             else:
-                await send_text_to_user(
+                messages.append(OutboxMessage(
                     uid,
-                    f"🔔Напоминание об игре: {g_date} {g_name}\n{get_game_rules(g_name, g_date).strip()}\nБудем вас ждать!😊",
-                    reply_markup=vk_reminder_actions_keyboard(game_id, bool(row and row[0] == "registered"))
-                )
-
-            count += 1
+                    f"Привет! Пора определиться, пойдешь играть? *{g_date} {g_name}*\n{get_game_rules(g_name, g_date).strip()}",
+                    reply_markup=vk_thinking_reminder_actions_keyboard(game_id)
+                ))
+            continue
 
-        except Exception as e:
-            logging.error(f"Не удалось отправить напоминание {uid}: {e}")
+        # Если пользователь отказался — не шлём повторно
+        if status == "declined":
+            continue
 
-    return count
+        if detect_platform_by_user_id(uid) == PLATFORM_TELEGRAM:
+            messages.append(OutboxMessage(
+                uid,
+                f"🔔Напоминание об игре: {g_date} {g_name}\n{get_game_rules(g_name, g_date).strip()}\nБудем вас ждать!😊",
+                reply_markup=telegram_reminder_keyboard(game_id, status == "registered")
+            ))
+        else:
+            messages.append(OutboxMessage(
+                uid,
+                f"🔔Напоминание об игре: {g_date} {g_name}\n{get_game_rules(g_name, g_date).strip()}\nБудем вас ждать!😊",
+                reply_markup=vk_reminder_actions_keyboard(game_id, status == "registered")
+            ))
+
+    return await enqueue_campaign(
+        f"Напоминания об игре {g_date} {g_name}",
+        messages,
+        requested_by=requested_by,
+        campaign_id=campaign_id
+    )
 
 @dp.message(Form.admin_broadcast)
 async def admin_broadcast_handler(message: types.Message, state: FSMContext):
@@ -2356,7 +3283,7 @@ async def admin_broadcast_handler(message: types.Message, state: FSMContext):
         return
 
     if message.text == "👥Всем пользователям":
-        users = execute_query("SELECT user_id FROM users", fetch=True)
+        users = await execute_query_async("SELECT user_id FROM users WHERE unreachable_since IS NULL", fetch=True)
         target_users = [uid for (uid,) in users]
         await state.update_data(broadcast_target_users=target_users)
         await message.answer("Введите сообщение для рассылки:")
@@ -2364,24 +3291,19 @@ async def admin_broadcast_handler(message: types.Message, state: FSMContext):
         return
 
     if message.text in ["✅Только записавшимся", "❌Только не записавшимся"]:
-        games = sort_games_by_date(filter_upcoming_games(execute_query("SELECT game_id, game_name, game_date FROM games WHERE is_deleted = FALSE", fetch=True)))
+        games = await fetch_upcoming_games()
         if not games:
             await message.answer("Нет доступных игр для выбора.", reply_markup=admin_menu_keyboard())
             await state.set_state(Form.admin_menu)
             return
 
         await state.update_data(broadcast_filter_type=message.text)
-        builder = ReplyKeyboardBuilder()
-        for _, name, date in games:
-            builder.button(text=f"{date} {name}")
-        builder.button(text="🔙Назад")
-        builder.adjust(1)
-        await message.answer("Выберите игру для фильтра аудитории:", reply_markup=builder.as_markup(resize_keyboard=True))
+        await message.answer("Выберите игру для фильтра аудитории:", reply_markup=games_reply_keyboard(games))
         await state.set_state(Form.admin_broadcast_game)
         return
 
     if message.text in {"👤Выбрать пользователей", "👤Выбор пользователей"}:
-        users = execute_query("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
+        users = await execute_query_async("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
         if not users:
             await message.answer("Пользователей не найдено.")
             return
@@ -2405,12 +3327,7 @@ async def admin_broadcast_game_handler(message: types.Message, state: FSMContext
         await state.set_state(Form.admin_menu)
         return
 
-    clean_text = message.text.strip() if message.text else ""
-    result = execute_query(
-        "SELECT game_id FROM games WHERE game_date || ' ' || game_name = %s OR game_name || ' ' || game_date = %s",
-        (clean_text, clean_text),
-        fetchone=True
-    )
+    result = await find_game_by_label(message.text, is_deleted=None)
     if not result:
         await message.answer("Игра не найдена. Выбери игру кнопкой из списка.")
         return
@@ -2420,14 +3337,10 @@ async def admin_broadcast_game_handler(message: types.Message, state: FSMContext
     filter_type = data.get("broadcast_filter_type")
 
     if filter_type == "✅Только записавшимся":
-        rows = execute_query("SELECT user_id FROM registrations WHERE game_id = %s AND status = 'registered'", (game_id,), fetch=True)
+        rows = await execute_query_async(REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
         target_users = [r[0] for r in rows]
     else:
-        rows = execute_query(
-            "SELECT user_id FROM users WHERE user_id NOT IN (SELECT user_id FROM registrations WHERE game_id = %s AND status = 'registered')",
-            (game_id,),
-            fetch=True
-        )
+        rows = await execute_query_async(NOT_REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
         target_users = [r[0] for r in rows]
 
     await state.update_data(broadcast_target_users=target_users)
@@ -2485,15 +3398,14 @@ async def admin_broadcast_message_handler(message: types.Message, state: FSMCont
         await state.set_state(Form.admin_menu)
         return
 
-    count = 0
-    for user_id in users:
-        try:
-            await send_text_to_user(user_id, message.text)
-            count += 1
-        except Exception as e:
-            logging.error(f"Error sending broadcast to {user_id}: {e}")
+    count = await enqueue_campaign(
+        "Рассылка",
+        [OutboxMessage(user_id, message.text) for user_id in dict.fromkeys(users)],
+        requested_by=telegram_internal_user_id(message.from_user),
+        campaign_id=telegram_campaign_id(message)
+    )
 
-    await message.answer(f"Сообщение отправлено {count} пользователям.", reply_markup=admin_menu_keyboard())
+    await message.answer(f"Рассылка на {count} пользователей поставлена в очередь. Итог пришлю, когда отправка завершится.", reply_markup=admin_menu_keyboard())
     await state.set_state(Form.admin_menu)
 
 
@@ -2509,11 +3421,12 @@ def get_vk_state(user_id: int):
     return vk_states.get(user_id, {"state": "menu"})
 
 
-def send_vk_message(user_id: int, text: str, keyboard: str = None):
-    if not vk_api_client:
+async def send_vk_message(user_id: int, text: str, keyboard: str = None):
+    if not vk_async_api:
         logging.warning("VK API client недоступен, сообщение не отправлено пользователю %s", user_id)
         return
-    vk_api_client.messages.send(
+    await vk_async_api.method(
+        "messages.send",
         user_id=user_id,
         random_id=uuid.uuid4().int & 0x7FFFFFFF,
         message=text,
@@ -2521,8 +3434,8 @@ def send_vk_message(user_id: int, text: str, keyboard: str = None):
     )
 
 
-def prompt_vk_main_menu(vk_user_id: int):
-    send_vk_message(vk_user_id, "Выбери действие в меню ниже.", vk_main_menu_keyboard(make_internal_user_id(PLATFORM_VK, vk_user_id)))
+async def prompt_vk_main_menu(vk_user_id: int):
+    await send_vk_message(vk_user_id, "Выбери действие в меню ниже.", vk_main_menu_keyboard(make_internal_user_id(PLATFORM_VK, vk_user_id)))
     clear_vk_state(make_internal_user_id(PLATFORM_VK, vk_user_id))
 
 
@@ -2540,6 +3453,7 @@ def parse_vk_payload(payload_raw):
     return {}
 
 
+@cached_keyboard(keyboard_cache)
 def vk_number_choice_keyboard(items_count: int, back_label: str = "🔙 Назад"):
     keyboard = VkKeyboard(one_time=True)
     per_row = 4
@@ -2560,6 +3474,7 @@ def vk_number_choice_keyboard(items_count: int, back_label: str = "🔙 Наза
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_option_keyboard(labels, back_label: str = "🔙 Назад"):
     keyboard = VkKeyboard(one_time=True)
     for index, label in enumerate(labels):
@@ -2572,6 +3487,7 @@ def vk_option_keyboard(labels, back_label: str = "🔙 Назад"):
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_admin_participants_format_keyboard():
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button(
@@ -2596,6 +3512,7 @@ def vk_admin_participants_format_keyboard():
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(games_keyboard_cache)
 def vk_games_keyboard(games, back_label: str = "🔙Назад"):
     keyboard = VkKeyboard(one_time=True)
     for index, (game_id, game_name, game_date) in enumerate(games):
@@ -2612,6 +3529,7 @@ def vk_games_keyboard(games, back_label: str = "🔙Назад"):
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(games_keyboard_cache)
 def vk_late_button_keyboard(game_id: int):
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("⏰Опоздаю", color=VkKeyboardColor.SECONDARY, payload={"command": "mark_late", "game_id": game_id})
@@ -2620,6 +3538,7 @@ def vk_late_button_keyboard(game_id: int):
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(games_keyboard_cache)
 def vk_thinking_reminder_actions_keyboard(game_id: int):
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("Да, приду", color=VkKeyboardColor.POSITIVE, payload={"command": "thinking_reminder_yes", "game_id": game_id})
@@ -2630,6 +3549,7 @@ def vk_thinking_reminder_actions_keyboard(game_id: int):
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(games_keyboard_cache)
 def vk_reminder_actions_keyboard(game_id: int, is_registered: bool):
     keyboard = VkKeyboard(one_time=True)
     if is_registered:
@@ -2681,6 +3601,7 @@ def vk_reminder_user_selection_keyboard(users, selected_ids, page: int = 0, page
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_game_type_keyboard():
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("🏙️Городская мафия", color=VkKeyboardColor.SECONDARY, payload={"game_type": "🏙️Городская мафия"})
@@ -2693,6 +3614,7 @@ def vk_game_type_keyboard():
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_audience_keyboard(include_thinking: bool = False):
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("👥Всем пользователям", color=VkKeyboardColor.SECONDARY, payload={"audience": "all"})
@@ -2710,16 +3632,19 @@ def vk_audience_keyboard(include_thinking: bool = False):
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_back_keyboard():
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("🔙Назад", color=VkKeyboardColor.SECONDARY, payload={"command": "back"})
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_remove_keyboard():
     return json.dumps({"buttons": [], "one_time": False})
 
 
+@cached_keyboard(keyboard_cache)
 def vk_yes_no_keyboard():
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("Да", color=VkKeyboardColor.SECONDARY, payload={"answer": "yes"})
@@ -2727,6 +3652,7 @@ def vk_yes_no_keyboard():
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def confirm_profile_update_keyboard():
     builder = ReplyKeyboardBuilder()
     builder.button(text="✏️Обновить профиль")
@@ -2735,6 +3661,7 @@ def confirm_profile_update_keyboard():
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_keyboard(keyboard_cache)
 def intro_yes_no_keyboard():
     builder = ReplyKeyboardBuilder()
     builder.button(text="✅Да")
@@ -2743,12 +3670,14 @@ def intro_yes_no_keyboard():
     return builder.as_markup(resize_keyboard=True)
 
 
+@cached_keyboard(keyboard_cache)
 def vk_start_keyboard():
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("Начать", color=VkKeyboardColor.SECONDARY, payload={"command": "start"})
     return keyboard.get_keyboard()
 
 
+@cached_keyboard(keyboard_cache)
 def vk_confirm_profile_update_keyboard():
     keyboard = VkKeyboard(one_time=True)
     keyboard.add_button("✏️Обновить профиль", color=VkKeyboardColor.SECONDARY, payload={"command": "edit_profile"})
@@ -2757,11 +3686,11 @@ def vk_confirm_profile_update_keyboard():
     return keyboard.get_keyboard()
 
 
-def fetch_vk_user_profile(vk_user_id: int):
-    if not vk_api_client:
+async def fetch_vk_user_profile(vk_user_id: int):
+    if not vk_async_api:
         return {}
     try:
-        users = vk_api_client.users.get(user_ids=vk_user_id, fields="screen_name")
+        users = await vk_async_api.method("users.get", user_ids=vk_user_id, fields="screen_name")
         if users:
             return users[0]
     except Exception as e:
@@ -2769,7 +3698,7 @@ def fetch_vk_user_profile(vk_user_id: int):
     return {}
 
 
-def save_platform_profile(
+async def save_platform_profile(
     platform: str,
     platform_user_id: int,
     first_name: str,
@@ -2779,15 +3708,11 @@ def save_platform_profile(
     telegram_username: str = None,
 ):
     internal_user_id = make_internal_user_id(platform, platform_user_id)
-    existing = execute_query(
-        "SELECT age, vk_username FROM users WHERE user_id = %s",
-        (internal_user_id,),
-        fetchone=True
-    )
-    saved_age = existing[0] if existing and existing[0] is not None else 18
-    vk_username = existing[1] if existing and len(existing) > 1 else None
+    existing = await get_user_record(internal_user_id)
+    saved_age = existing[8] if existing and existing[8] is not None else 18
+    vk_username = existing[7] if existing else None
     resolved_age = saved_age if age is None else age
-    return upsert_user(
+    return await upsert_user(
         platform=platform,
         platform_user_id=platform_user_id,
         first_name=first_name,
@@ -2799,7 +3724,7 @@ def save_platform_profile(
     )
 
 
-def send_vk_games_list(
+async def send_vk_games_list(
     vk_user_id: int,
     games,
     action: str,
@@ -2808,18 +3733,18 @@ def send_vk_games_list(
     use_game_buttons: bool = False
 ):
     if not games:
-        send_vk_message(vk_user_id, "Список игр сейчас пуст.", vk_main_menu_keyboard(make_internal_user_id(PLATFORM_VK, vk_user_id)))
+        await send_vk_message(vk_user_id, "Список игр сейчас пуст.", vk_main_menu_keyboard(make_internal_user_id(PLATFORM_VK, vk_user_id)))
         return
 
     if use_game_buttons:
-        send_vk_message(vk_user_id, title, vk_games_keyboard(games, back_label=back_label))
+        await send_vk_message(vk_user_id, title, vk_games_keyboard(games, back_label=back_label))
     else:
         lines = [title]
         for index, (_, game_name, game_date) in enumerate(games, start=1):
             lines.append(f"{index}. {game_date} {game_name}")
         lines.append("")
         lines.append("Выбери игру кнопкой ниже или отправь её номер сообщением.")
-        send_vk_message(vk_user_id, "\n".join(lines), vk_number_choice_keyboard(len(games), back_label=back_label))
+        await send_vk_message(vk_user_id, "\n".join(lines), vk_number_choice_keyboard(len(games), back_label=back_label))
     set_vk_state(make_internal_user_id(PLATFORM_VK, vk_user_id), action, games=games)
 
 
@@ -2851,9 +3776,9 @@ def get_vk_selected_game(state, selected_text: str, payload: dict = None):
     return games[index]
 
 
-def send_vk_user_selection_list(vk_user_id: int, users, title: str):
+async def send_vk_user_selection_list(vk_user_id: int, users, title: str):
     if not users:
-        send_vk_message(vk_user_id, "Пользователи не найдены.", vk_admin_menu_keyboard())
+        await send_vk_message(vk_user_id, "Пользователи не найдены.", vk_admin_menu_keyboard())
         return
 
     lines = [title]
@@ -2861,70 +3786,50 @@ def send_vk_user_selection_list(vk_user_id: int, users, title: str):
         lines.append(f"{index}. {first_name} {last_name} ({nick})")
     lines.append("")
     lines.append("Отправь номера пользователей через запятую, например: 1,3,5")
-    send_vk_message(vk_user_id, "\n".join(lines), vk_back_keyboard())
+    await send_vk_message(vk_user_id, "\n".join(lines), vk_back_keyboard())
 
 
 
 
 async def handle_thinking_reminder_decline(user_id: int, game_id: int):
-    game = execute_query(
-        "SELECT game_name, game_date FROM games WHERE game_id = %s",
-        (game_id,),
-        fetchone=True
-    )
+    game = await get_game_info(game_id)
     if not game:
         return "Игра не найдена."
 
-    execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (user_id, game_id))
+    await execute_query_async("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (user_id, game_id))
+    invalidate_participants_cache(game_id)
 
-    user_row = execute_query(
-        "SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s",
-        (user_id,),
-        fetchone=True
-    )
+    user_row = await get_user_names(user_id)
     if user_row:
         await notify_admin(f"❌Отказ на игру: {user_row[0]} {user_row[1]} ({user_row[2]}) на {game[1]} {game[0]}")
 
     return "Отметку «думаю» сняли. Спасибо за ответ!"
 
 async def handle_vk_registration(internal_user_id: int, game_id: int):
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s AND is_deleted = FALSE", (game_id,), fetchone=True)
-    if not game:
+    registration = await register_user_for_game_async(internal_user_id, game_id, active_only=True)
+    if registration.status == REGISTRATION_GAME_NOT_FOUND:
         return "Игра не найдена."
 
-    game_name, game_date = game
-    user_age_row = execute_query("SELECT age FROM users WHERE user_id = %s", (internal_user_id,), fetchone=True)
-    user_age = user_age_row[0] if user_age_row else None
-    age_rejection = get_registration_age_rejection(game_name, user_age)
-    if age_rejection:
-        return age_rejection
+    if registration.status == REGISTRATION_AGE_REJECTED:
+        return registration.age_rejection
 
-    if await is_game_full(game_id, game_name, internal_user_id):
+    if registration.status == REGISTRATION_GAME_FULL:
         return (
             "К сожалению, на данную игру записалось максимальное количество участников😢\n"
             "Попробуй выбрать другую игру."
         )
 
-    execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (internal_user_id, game_id))
-    execute_query(
-        """
-        INSERT INTO registrations (user_id, game_id, status, is_late)
-        VALUES (%s, %s, 'registered', FALSE)
-        ON CONFLICT (user_id, game_id)
-        DO UPDATE SET status = 'registered', is_late = FALSE
-        """,
-        (internal_user_id, game_id)
-    )
-
-    user_row = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
-    if user_row:
-        await notify_admin(f"Новая запись: {user_row[0]} {user_row[1]} ({user_row[2]}) на {game_date} {game_name}")
+    if registration.has_profile:
+        await notify_admin(
+            f"Новая запись: {registration.first_name} {registration.last_name} ({registration.mafia_nick}) "
+            f"на {registration.game_date} {registration.game_name}"
+        )
 
-    return build_registration_success_text(game_date, game_name)
+    return build_registration_success_text(registration.game_date, registration.game_name)
 
 
 async def handle_vk_mark_late(internal_user_id: int, game_id: int):
-    reg = execute_query(
+    reg = await execute_query_async(
         "SELECT 1 FROM registrations WHERE user_id=%s AND game_id=%s AND status='registered'",
         (internal_user_id, game_id),
         fetchone=True
@@ -2932,33 +3837,31 @@ async def handle_vk_mark_late(internal_user_id: int, game_id: int):
     if not reg:
         return "Сначала нужно записаться на игру."
 
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s", (game_id,), fetchone=True)
+    game = await get_game_info(game_id)
     if not game:
         return "Игра не найдена."
 
     await mark_late(internal_user_id, game_id)
-    user_row = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
+    user_row = await get_user_names(internal_user_id)
     if user_row:
         await notify_admin(f"⏰Опоздает: {user_row[0]} {user_row[1]} ({user_row[2]}) на {game[1]} {game[0]}")
     return "Отметили, что ты опоздаешь⏰"
 
 
 async def handle_vk_cancel_registration(internal_user_id: int, game_id: int):
-    game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s AND is_deleted = FALSE", (game_id,), fetchone=True)
+    game = await get_game_info(game_id, active_only=True)
     if not game:
         return "Игра не найдена."
 
-    execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (internal_user_id, game_id))
-    await unmark_late(internal_user_id, game_id)
-    execute_query("DELETE FROM registrations WHERE user_id=%s AND game_id=%s", (internal_user_id, game_id))
+    await cancel_user_registration(internal_user_id, game_id)
 
-    user_row = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
+    user_row = await get_user_names(internal_user_id)
     if user_row:
         await notify_admin(f"❌Отмена записи: {user_row[0]} {user_row[1]} ({user_row[2]}) на {game[1]} {game[0]}")
     return "Запись отменена. Будем ждать тебя на следующих играх."
 
 
-def handle_vk_profile_step(internal_user_id: int, vk_user_id: int, text: str, command: str = None):
+async def handle_vk_profile_step(internal_user_id: int, vk_user_id: int, text: str, command: str = None):
     state = get_vk_state(internal_user_id)
     current = state.get("state")
     normalized_text = text.strip().lower()
@@ -2966,7 +3869,7 @@ def handle_vk_profile_step(internal_user_id: int, vk_user_id: int, text: str, co
     if current == "awaiting_intro_confirm":
         if normalized_text in {"да", "✅да"}:
             set_vk_state(internal_user_id, "awaiting_nick")
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Какой твой игровой ник в мафии?\n\n"
                 "P.S. В мафии используют ники для того, чтобы разделять игру и реальную жизнь.",
@@ -2975,48 +3878,48 @@ def handle_vk_profile_step(internal_user_id: int, vk_user_id: int, text: str, co
             return True
         if normalized_text in {"нет", "❌нет"}:
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, "Хорошо, напиши «Начать», когда будешь готов.", vk_start_keyboard())
+            await send_vk_message(vk_user_id, "Хорошо, напиши «Начать», когда будешь готов.", vk_start_keyboard())
             return True
-        send_vk_message(vk_user_id, "Пожалуйста, выбери «Да» или «Нет» кнопкой ниже.", vk_yes_no_keyboard())
+        await send_vk_message(vk_user_id, "Пожалуйста, выбери «Да» или «Нет» кнопкой ниже.", vk_yes_no_keyboard())
         return True
 
     if current == "vk_confirm_profile_update":
         if normalized_text in {"✏️обновить профиль", "обновить профиль", "обновить"}:
             set_vk_state(internal_user_id, "vk_edit_profile_nick")
-            send_vk_message(vk_user_id, "Давай обновим профиль. Какой у тебя сейчас игровой ник в мафии?", vk_back_keyboard())
+            await send_vk_message(vk_user_id, "Давай обновим профиль. Какой у тебя сейчас игровой ник в мафии?", vk_back_keyboard())
             return True
         if normalized_text in {"✅оставить как есть", "оставить как есть", "оставить"}:
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, "Отлично! Переходим в главное меню.", vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, "Отлично! Переходим в главное меню.", vk_main_menu_keyboard(internal_user_id))
             return True
-        send_vk_message(vk_user_id, "Выбери один из вариантов кнопкой ниже.", vk_confirm_profile_update_keyboard())
+        await send_vk_message(vk_user_id, "Выбери один из вариантов кнопкой ниже.", vk_confirm_profile_update_keyboard())
         return True
 
     if current in {"vk_edit_profile_nick", "vk_edit_profile_age"} and (
         normalized_text in {"назад", "🔙назад", "🔙 назад"} or command == "back"
     ):
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, "Хорошо, возвращаю в главное меню.", vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "Хорошо, возвращаю в главное меню.", vk_main_menu_keyboard(internal_user_id))
         return True
 
     if current == "vk_edit_profile_nick":
         set_vk_state(internal_user_id, "vk_edit_profile_age", mafia_nick=text.strip())
-        send_vk_message(vk_user_id, "Отлично! Теперь укажи свой возраст цифрами.", vk_back_keyboard())
+        await send_vk_message(vk_user_id, "Отлично! Теперь укажи свой возраст цифрами.", vk_back_keyboard())
         return True
 
     if current == "vk_edit_profile_age":
         try:
             age = int(text.strip())
         except ValueError:
-            send_vk_message(vk_user_id, "Пожалуйста, введи возраст цифрами.", vk_back_keyboard())
+            await send_vk_message(vk_user_id, "Пожалуйста, введи возраст цифрами.", vk_back_keyboard())
             return True
 
-        vk_profile = fetch_vk_user_profile(vk_user_id)
+        vk_profile = await fetch_vk_user_profile(vk_user_id)
         first_name = vk_profile.get("first_name") or "Имя"
         last_name = vk_profile.get("last_name") or "Фамилия"
         vk_username = vk_profile.get("screen_name")
 
-        upsert_user(
+        await upsert_user(
             platform=PLATFORM_VK,
             platform_user_id=vk_user_id,
             first_name=first_name,
@@ -3031,27 +3934,27 @@ def handle_vk_profile_step(internal_user_id: int, vk_user_id: int, text: str, co
             messages.append(get_age_restriction_notice())
         messages.append("Профиль обновлен.")
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, "\n\n".join(messages), vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "\n\n".join(messages), vk_main_menu_keyboard(internal_user_id))
         return True
 
     if current == "awaiting_nick":
         set_vk_state(internal_user_id, "awaiting_age", mafia_nick=text.strip())
-        send_vk_message(vk_user_id, "Отлично! Теперь укажи свой возраст цифрами.")
+        await send_vk_message(vk_user_id, "Отлично! Теперь укажи свой возраст цифрами.")
         return True
 
     if current == "awaiting_age":
         try:
             age = int(text.strip())
         except ValueError:
-            send_vk_message(vk_user_id, "Пожалуйста, введи возраст цифрами.")
+            await send_vk_message(vk_user_id, "Пожалуйста, введи возраст цифрами.")
             return True
 
-        vk_profile = fetch_vk_user_profile(vk_user_id)
+        vk_profile = await fetch_vk_user_profile(vk_user_id)
         first_name = vk_profile.get("first_name") or "Имя"
         last_name = vk_profile.get("last_name") or "Фамилия"
         vk_username = vk_profile.get("screen_name")
 
-        upsert_user(
+        await upsert_user(
             platform=PLATFORM_VK,
             platform_user_id=vk_user_id,
             first_name=first_name,
@@ -3065,7 +3968,7 @@ def handle_vk_profile_step(internal_user_id: int, vk_user_id: int, text: str, co
         if age < 18:
             message_parts.append(get_age_restriction_notice())
         message_parts.append("Спасибо за знакомство! Теперь ты можешь записываться на игры и смотреть общие списки участников.")
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             "\n\n".join(message_parts),
             vk_main_menu_keyboard(internal_user_id),
@@ -3112,12 +4015,12 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
 
     if not is_admin:
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, "У тебя нет доступа к админ-меню.", vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "У тебя нет доступа к админ-меню.", vk_main_menu_keyboard(internal_user_id))
         return True
 
     if command == "admin_add_game":
         set_vk_state(internal_user_id, "admin_add_date")
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             "Введи дату игры цифрами в формате ДД.ММ или ДД.ММ.ГГГГ.\nНапример: 27.03 или 27.03.2026",
             vk_back_keyboard()
@@ -3126,36 +4029,36 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
 
     if normalized_text == "🏠Главное меню" or command == "main_menu":
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, "Возвращаюсь в главное меню.", vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "Возвращаюсь в главное меню.", vk_main_menu_keyboard(internal_user_id))
         return True
 
     if normalized_text == "🔙Назад" or command == "back":
         if current == "admin_add_type":
             set_vk_state(internal_user_id, "admin_add_date")
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Введи дату игры цифрами в формате ДД.ММ или ДД.ММ.ГГГГ.",
                 vk_back_keyboard()
             )
         elif current == "admin_reminder_audience":
-            games = fetch_upcoming_games()
-            send_vk_games_list(vk_user_id, games, "admin_reminder_game", "Для какой игры отправить напоминание?", use_game_buttons=True)
+            games = await fetch_upcoming_games()
+            await send_vk_games_list(vk_user_id, games, "admin_reminder_game", "Для какой игры отправить напоминание?", use_game_buttons=True)
         elif current == "admin_reminder_custom_users":
             set_vk_state(internal_user_id, "admin_reminder_audience", reminder_game_id=state.get("reminder_game_id"))
-            send_vk_message(vk_user_id, "Кому отправить напоминание?", vk_audience_keyboard(include_thinking=True))
+            await send_vk_message(vk_user_id, "Кому отправить напоминание?", vk_audience_keyboard(include_thinking=True))
         elif current in {"admin_broadcast_game", "admin_broadcast_custom_users", "admin_broadcast_message"}:
             set_vk_state(internal_user_id, "admin_broadcast_audience")
-            send_vk_message(vk_user_id, "Кому отправить сообщение?", vk_audience_keyboard())
+            await send_vk_message(vk_user_id, "Кому отправить сообщение?", vk_audience_keyboard())
         else:
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, "Возвращаюсь в админ-меню.", vk_admin_menu_keyboard())
+            await send_vk_message(vk_user_id, "Возвращаюсь в админ-меню.", vk_admin_menu_keyboard())
         return True
 
     if current == "admin_add_date":
-        parsed = parse_game_date(normalized_text)
+        parsed = database.parse_game_date(normalized_text)
 
         if not parsed:
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Не удалось распознать дату. Введи дату цифрами в формате ДД.ММ или ДД.ММ.ГГГГ.",
                 vk_back_keyboard()
@@ -3165,9 +4068,10 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
         set_vk_state(
             internal_user_id,
             "admin_add_type",
-            game_date=formatted_date
+            game_date=formatted_date,
+            game_on=parsed.isoformat()
         )
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             "Выбери тип игры кнопкой ниже.",
             vk_game_type_keyboard()
@@ -3185,18 +4089,22 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
         }
         selected_type = payload.get("game_type") or game_types.get(text.strip().lower())
         if not selected_type:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери тип игры кнопкой ниже.", vk_game_type_keyboard())
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери тип игры кнопкой ниже.", vk_game_type_keyboard())
             return True
         game_date = state.get("game_date")
-        execute_query("INSERT INTO games (game_date, game_name) VALUES (%s, %s)", (game_date, selected_type))
+        await execute_query_async(
+            "INSERT INTO games (game_date, game_name, game_on) VALUES (%s, %s, %s)",
+            (game_date, selected_type, state.get("game_on"))
+        )
+        invalidate_games_catalog()
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, f"Игра '{game_date} {selected_type}' успешно добавлена.", vk_admin_menu_keyboard())
+        await send_vk_message(vk_user_id, f"Игра '{game_date} {selected_type}' успешно добавлена.", vk_admin_menu_keyboard())
         return True
 
     if current == "admin_reminder_game":
         selected_game = get_vk_selected_game(state, normalized_text, payload)
         if not selected_game:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
             return True
         game_id, game_name, game_date = selected_game
         set_vk_state(
@@ -3205,33 +4113,39 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
             reminder_game_id=game_id,
             reminder_game_text=f"{game_date} {game_name}"
         )
-        send_vk_message(vk_user_id, "Кому отправить напоминание?", vk_audience_keyboard(include_thinking=True))
+        await send_vk_message(vk_user_id, "Кому отправить напоминание?", vk_audience_keyboard(include_thinking=True))
         return True
 
     if current == "admin_reminder_audience":
         game_id = state.get("reminder_game_id")
         if normalized_text == "👥 Всем пользователям" or audience == "all":
-            rows = execute_query("SELECT user_id FROM users", fetch=True)
+            rows = await execute_query_async("SELECT user_id FROM users WHERE unreachable_since IS NULL", fetch=True)
             target_users = [r[0] for r in rows]
         elif normalized_text == "✅Только записавшимся" or audience == "registered":
-            rows = execute_query("SELECT user_id FROM registrations WHERE game_id = %s", (game_id,), fetch=True)
+            rows = await execute_query_async(REMINDER_REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
             target_users = [r[0] for r in rows]
         elif normalized_text == "❌Только не записавшимся" or audience == "not_registered":
-            rows = execute_query("SELECT user_id FROM users WHERE user_id NOT IN (SELECT user_id FROM registrations WHERE game_id = %s)", (game_id,), fetch=True)
+            rows = await execute_query_async(REMINDER_NOT_REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
             target_users = [r[0] for r in rows]
         elif normalized_text == "🤔Думающим игрокам" or audience == "thinking":
-            rows = execute_query("SELECT user_id FROM thinking_players WHERE game_id = %s", (game_id,), fetch=True)
+            rows = await execute_query_async(THINKING_AUDIENCE_QUERY, (game_id,), fetch=True)
             target_users = [r[0] for r in rows]
             if not target_users:
                 clear_vk_state(internal_user_id)
-                send_vk_message(vk_user_id, "Нет думающих игроков для этой игры.", vk_admin_menu_keyboard())
+                await send_vk_message(vk_user_id, "Нет думающих игроков для этой игры.", vk_admin_menu_keyboard())
                 return True
-            count = await send_game_reminders(target_users, game_id, thinking_decision=True)
+            count = await send_game_reminders(
+                target_users,
+                game_id,
+                thinking_decision=True,
+                requested_by=internal_user_id,
+                campaign_id=vk_campaign_id(vk_user_id)
+            )
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, f"Напоминания отправлены {count} думающим игрокам.", vk_admin_menu_keyboard())
+            await send_vk_message(vk_user_id, f"Напоминания для {count} думающих игроков поставлены в очередь. Итог пришлю, когда отправка завершится.", vk_admin_menu_keyboard())
             return True
         elif normalized_text in {"👤Выбрать пользователей", "👤Выбор пользователей"} or audience == "custom":
-            users = execute_query("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
+            users = await execute_query_async("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
             set_vk_state(
                 internal_user_id,
                 "admin_reminder_custom_users",
@@ -3240,19 +4154,24 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
                 selected_user_ids=[],
                 selected_user_page=0
             )
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Выбери пользователей для напоминания:",
                 vk_reminder_user_selection_keyboard(users, [], page=0)
             )
             return True
         else:
-            send_vk_message(vk_user_id, "Выбери аудиторию кнопкой ниже.", vk_audience_keyboard(include_thinking=(current == "admin_reminder_audience")))
+            await send_vk_message(vk_user_id, "Выбери аудиторию кнопкой ниже.", vk_audience_keyboard(include_thinking=(current == "admin_reminder_audience")))
             return True
 
-        count = await send_game_reminders(target_users, game_id)
+        count = await send_game_reminders(
+            target_users,
+            game_id,
+            requested_by=internal_user_id,
+            campaign_id=vk_campaign_id(vk_user_id)
+        )
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, f"Напоминания отправлены {count} пользователям.", vk_admin_menu_keyboard())
+        await send_vk_message(vk_user_id, f"Напоминания для {count} пользователей поставлены в очередь. Итог пришлю, когда отправка завершится.", vk_admin_menu_keyboard())
         return True
 
     if current == "admin_reminder_custom_users":
@@ -3263,7 +4182,7 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
         if command == "rem_sel_page":
             requested_page = payload.get("page")
             if not isinstance(requested_page, int):
-                send_vk_message(vk_user_id, "Не удалось переключить страницу. Попробуй ещё раз.")
+                await send_vk_message(vk_user_id, "Не удалось переключить страницу. Попробуй ещё раз.")
                 return True
             set_vk_state(
                 internal_user_id,
@@ -3273,7 +4192,7 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
                 selected_user_ids=list(selected),
                 selected_user_page=requested_page
             )
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Выбери пользователей для напоминания:",
                 vk_reminder_user_selection_keyboard(users, selected, page=requested_page)
@@ -3284,7 +4203,7 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
             user_id = payload.get("user_id")
             page = payload.get("page", current_page)
             if not isinstance(user_id, int):
-                send_vk_message(vk_user_id, "Не удалось определить пользователя. Попробуй ещё раз.")
+                await send_vk_message(vk_user_id, "Не удалось определить пользователя. Попробуй ещё раз.")
                 return True
             if user_id in selected:
                 selected.remove(user_id)
@@ -3298,7 +4217,7 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
                 selected_user_ids=list(selected),
                 selected_user_page=page
             )
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Выбери пользователей для напоминания:",
                 vk_reminder_user_selection_keyboard(users, selected, page=page)
@@ -3306,7 +4225,7 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
             return True
 
         if command != "rem_sel_done":
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Выбирай пользователей кнопками ниже.",
                 vk_reminder_user_selection_keyboard(users, selected, page=current_page)
@@ -3314,20 +4233,25 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
             return True
 
         if not selected:
-            send_vk_message(vk_user_id, "Никто не выбран. Выбери хотя бы одного пользователя.")
+            await send_vk_message(vk_user_id, "Никто не выбран. Выбери хотя бы одного пользователя.")
             return True
 
-        count = await send_game_reminders(list(selected), state.get("reminder_game_id"))
+        count = await send_game_reminders(
+            list(selected),
+            state.get("reminder_game_id"),
+            requested_by=internal_user_id,
+            campaign_id=vk_campaign_id(vk_user_id)
+        )
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, f"Напоминания отправлены {count} выбранным пользователям.", vk_admin_menu_keyboard())
+        await send_vk_message(vk_user_id, f"Напоминания для {count} выбранных пользователей поставлены в очередь. Итог пришлю, когда отправка завершится.", vk_admin_menu_keyboard())
         return True
 
     if current == "admin_broadcast_audience":
         if normalized_text == "👥 Всем пользователям" or audience == "all":
-            rows = execute_query("SELECT user_id FROM users", fetch=True)
+            rows = await execute_query_async("SELECT user_id FROM users WHERE unreachable_since IS NULL", fetch=True)
             target_users = [r[0] for r in rows]
             set_vk_state(internal_user_id, "admin_broadcast_message", broadcast_target_users=target_users)
-            send_vk_message(vk_user_id, "Введи сообщение для рассылки.", vk_back_keyboard())
+            await send_vk_message(vk_user_id, "Введи сообщение для рассылки.", vk_back_keyboard())
             return True
         if normalized_text in {"✅Только записавшимся", "❌Только не записавшимся"} or audience in {"registered", "not_registered"}:
             filter_type = normalized_text
@@ -3336,15 +4260,15 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
             elif audience == "not_registered":
                 filter_type = "❌Только не записавшимся"
             set_vk_state(internal_user_id, "admin_broadcast_game", broadcast_filter_type=filter_type)
-            games = fetch_upcoming_games()
-            send_vk_games_list(vk_user_id, games, "admin_broadcast_game", "Для какой игры отфильтровать аудиторию?", use_game_buttons=True)
+            games = await fetch_upcoming_games()
+            await send_vk_games_list(vk_user_id, games, "admin_broadcast_game", "Для какой игры отфильтровать аудиторию?", use_game_buttons=True)
             return True
         if normalized_text in {"👤Выбрать пользователей", "👤Выбор пользователей"} or audience == "custom":
-            users = execute_query("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
+            users = await execute_query_async("SELECT user_id, first_name, last_name, mafia_nick FROM users", fetch=True)
             set_vk_state(internal_user_id, "admin_broadcast_custom_users", selectable_users=users)
-            send_vk_user_selection_list(vk_user_id, users, "Выбери пользователей для рассылки:")
+            await send_vk_user_selection_list(vk_user_id, users, "Выбери пользователей для рассылки:")
             return True
-        send_vk_message(vk_user_id, "Выбери аудиторию кнопкой ниже.", vk_audience_keyboard(include_thinking=(current == "admin_reminder_audience")))
+        await send_vk_message(vk_user_id, "Выбери аудиторию кнопкой ниже.", vk_audience_keyboard(include_thinking=(current == "admin_reminder_audience")))
         return True
 
     if current == "admin_broadcast_custom_users":
@@ -3352,77 +4276,80 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
         try:
             indexes = [int(item.strip()) - 1 for item in normalized_text.split(",") if item.strip()]
         except ValueError:
-            send_vk_message(vk_user_id, "Не удалось распознать номера. Отправь их через запятую, например: 1,3,5", vk_back_keyboard())
+            await send_vk_message(vk_user_id, "Не удалось распознать номера. Отправь их через запятую, например: 1,3,5", vk_back_keyboard())
             return True
         if not indexes or any(index < 0 or index >= len(users) for index in indexes):
-            send_vk_message(vk_user_id, "Проверь номера пользователей и попробуй еще раз.", vk_back_keyboard())
+            await send_vk_message(vk_user_id, "Проверь номера пользователей и попробуй еще раз.", vk_back_keyboard())
             return True
         target_users = [users[index][0] for index in indexes]
         set_vk_state(internal_user_id, "admin_broadcast_message", broadcast_target_users=target_users)
-        send_vk_message(vk_user_id, "Введи сообщение для рассылки.", vk_back_keyboard())
+        await send_vk_message(vk_user_id, "Введи сообщение для рассылки.", vk_back_keyboard())
         return True
 
     if current == "admin_broadcast_game":
         selected_game = get_vk_selected_game(state, normalized_text, payload)
         if not selected_game:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
             return True
         game_id = selected_game[0]
         filter_type = state.get("broadcast_filter_type")
         if filter_type == "✅Только записавшимся":
-            rows = execute_query("SELECT user_id FROM registrations WHERE game_id = %s AND status = 'registered'", (game_id,), fetch=True)
+            rows = await execute_query_async(REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
             target_users = [r[0] for r in rows]
         else:
-            rows = execute_query(
-                "SELECT user_id FROM users WHERE user_id NOT IN (SELECT user_id FROM registrations WHERE game_id = %s AND status = 'registered')",
-                (game_id,),
-                fetch=True
-            )
+            rows = await execute_query_async(NOT_REGISTERED_AUDIENCE_QUERY, (game_id,), fetch=True)
             target_users = [r[0] for r in rows]
         set_vk_state(internal_user_id, "admin_broadcast_message", broadcast_target_users=target_users)
-        send_vk_message(vk_user_id, "Введи сообщение для рассылки.", vk_back_keyboard())
+        await send_vk_message(vk_user_id, "Введи сообщение для рассылки.", vk_back_keyboard())
         return True
 
     if current == "admin_broadcast_message":
         users = state.get("broadcast_target_users", [])
-        count = 0
-        for user_id in users:
-            try:
-                await send_text_to_user(user_id, normalized_text)
-                count += 1
-            except Exception as e:
-                logging.error(f"Error sending VK broadcast to {user_id}: {e}")
+        count = await enqueue_campaign(
+            "Рассылка",
+            [OutboxMessage(user_id, normalized_text) for user_id in dict.fromkeys(users)],
+            requested_by=internal_user_id,
+            campaign_id=vk_campaign_id(vk_user_id)
+        )
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, f"Сообщение отправлено {count} пользователям.", vk_admin_menu_keyboard())
+        await send_vk_message(vk_user_id, f"Рассылка на {count} пользователей поставлена в очередь. Итог пришлю, когда отправка завершится.", vk_admin_menu_keyboard())
         return True
 
     if current in {"admin_delete_game", "admin_restore_game", "admin_cancel_game", "admin_view_participants"}:
         selected_game = get_vk_selected_game(state, normalized_text, payload)
         if not selected_game:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
             return True
         game_id, game_name, game_date = selected_game[:3]
         if current == "admin_delete_game":
-            execute_query("UPDATE games SET is_deleted = TRUE WHERE game_id = %s", (game_id,))
+            await execute_query_async("UPDATE games SET is_deleted = TRUE WHERE game_id = %s", (game_id,))
+            invalidate_games_catalog()
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, f"Игра '{game_date} {game_name}' удалена.", vk_admin_menu_keyboard())
+            await send_vk_message(vk_user_id, f"Игра '{game_date} {game_name}' удалена.", vk_admin_menu_keyboard())
             return True
         if current == "admin_restore_game":
-            execute_query("UPDATE games SET is_deleted = FALSE WHERE game_id = %s", (game_id,))
+            await execute_query_async("UPDATE games SET is_deleted = FALSE WHERE game_id = %s", (game_id,))
+            invalidate_games_catalog()
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, f"Игра '{game_date} {game_name}' восстановлена.", vk_admin_menu_keyboard())
+            await send_vk_message(vk_user_id, f"Игра '{game_date} {game_name}' восстановлена.", vk_admin_menu_keyboard())
             return True
         if current == "admin_cancel_game":
-            participants = execute_query("SELECT user_id FROM registrations WHERE game_id = %s", (game_id,), fetch=True)
-            for (participant_id,) in participants:
-                await send_text_to_user(participant_id, f"⚠️Внимание! Отмена игры на {game_date} {game_name}!⚠️")
-            execute_query("DELETE FROM registrations WHERE game_id = %s", (game_id,))
-            execute_query("DELETE FROM games WHERE game_id = %s", (game_id,))
+            participants = await execute_query_async("SELECT user_id FROM registrations WHERE game_id = %s", (game_id,), fetch=True)
+            await enqueue_campaign(
+                f"Уведомления об отмене игры {game_date} {game_name}",
+                [
+                    OutboxMessage(participant_id, f"⚠️Внимание! Отмена игры на {game_date} {game_name}!⚠️")
+                    for (participant_id,) in participants
+                ],
+                requested_by=internal_user_id,
+                campaign_id=vk_campaign_id(vk_user_id)
+            )
+            await delete_game(game_id)
             clear_vk_state(internal_user_id)
-            send_vk_message(vk_user_id, f"Игра '{game_date} {game_name}' отменена.", vk_admin_menu_keyboard())
+            await send_vk_message(vk_user_id, f"Игра '{game_date} {game_name}' отменена.", vk_admin_menu_keyboard())
             return True
         game_title = build_game_title(game_name, game_date)
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             await format_admin_participants_with_format(game_id, game_title, ADMIN_PARTICIPANTS_FORMAT_NAME_NICK),
             vk_admin_menu_keyboard()
@@ -3433,12 +4360,23 @@ async def handle_vk_admin_flow(internal_user_id: int, vk_user_id: int, text: str
     return False
 
 
+async def process_vk_message(vk_user_id: int, text: str, payload_raw=None, message_id: int = None):
+    vk_current_message_id.set(message_id)
+    try:
+        await mark_user_reachable(make_internal_user_id(PLATFORM_VK, vk_user_id))
+        await touch_user_activity(make_internal_user_id(PLATFORM_VK, vk_user_id))
+        await handle_vk_message(vk_user_id, text, payload_raw)
+    except (database.DatabaseUnavailable, database.PoolTimeout) as exc:
+        logging.warning("VK-сообщение не обработано: база данных недоступна (%s)", exc)
+        await send_vk_message(vk_user_id, DB_UNAVAILABLE_TEXT)
+
+
 async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
     normalized_text = (text or "").strip()
     payload = parse_vk_payload(payload_raw)
     command = payload.get("command")
     internal_user_id = make_internal_user_id(PLATFORM_VK, vk_user_id)
-    user_exists = execute_query("SELECT 1 FROM users WHERE user_id = %s", (internal_user_id,), fetchone=True)
+    user_exists = await get_user_record(internal_user_id)
 
     if command == "keep_profile":
         normalized_text = "✅Оставить как есть"
@@ -3455,7 +4393,7 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
 
     if current_state == "awaiting_intro_confirm":
         if normalized_text_lower in {"да", "✅да", "нет", "❌нет"}:
-            if handle_vk_profile_step(internal_user_id, vk_user_id, normalized_text, command):
+            if await handle_vk_profile_step(internal_user_id, vk_user_id, normalized_text, command):
                 return
         if is_start_command:
             return
@@ -3463,14 +4401,14 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
     if is_start_command:
         if user_exists:
             set_vk_state(internal_user_id, "vk_confirm_profile_update")
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "С возвращением! Хочешь обновить профиль или оставить как есть?",
                 vk_confirm_profile_update_keyboard()
             )
         else:
             set_vk_state(internal_user_id, "awaiting_intro_confirm")
-            send_vk_message(
+            await send_vk_message(
                 vk_user_id,
                 "Привет!👋\n"
                 "Я бот, который поможет тебе записываться на мафию в клубе настольных игр Тайная комната.\n\n"
@@ -3483,19 +4421,19 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
         return
 
     if not user_exists:
-        if handle_vk_profile_step(internal_user_id, vk_user_id, normalized_text, command):
+        if await handle_vk_profile_step(internal_user_id, vk_user_id, normalized_text, command):
             return
         clear_vk_state(internal_user_id)
-        send_vk_message(vk_user_id, "Нажми кнопку «Начать», чтобы запустить бота.", vk_start_keyboard())
+        await send_vk_message(vk_user_id, "Нажми кнопку «Начать», чтобы запустить бота.", vk_start_keyboard())
         return
 
-    if handle_vk_profile_step(internal_user_id, vk_user_id, normalized_text, command):
+    if await handle_vk_profile_step(internal_user_id, vk_user_id, normalized_text, command):
         return
 
     state = get_vk_state(internal_user_id)
     current = state.get("state")
     if current in {"vk_register_select", "vk_cancel_select", "vk_participants_select"} and (normalized_text == "🔙 Назад" or command == "back"):
-        prompt_vk_main_menu(vk_user_id)
+        await prompt_vk_main_menu(vk_user_id)
         return
 
     if await handle_vk_admin_flow(internal_user_id, vk_user_id, normalized_text, payload):
@@ -3504,41 +4442,41 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
     state = get_vk_state(internal_user_id)
     current = state.get("state")
     if normalized_text == "🔙 Назад" or command == "back":
-        prompt_vk_main_menu(vk_user_id)
+        await prompt_vk_main_menu(vk_user_id)
         return
 
     if normalized_text == "🏠Главное меню" or command == "main_menu":
-        prompt_vk_main_menu(vk_user_id)
+        await prompt_vk_main_menu(vk_user_id)
         return
 
     if current == "vk_register_select":
         selected_game = get_vk_selected_game(state, normalized_text, payload)
         if not selected_game:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
             return
         response = await handle_vk_registration(internal_user_id, selected_game[0])
         keyboard = vk_late_button_keyboard(selected_game[0]) if response.startswith("Ты успешно записался на игру") else vk_main_menu_keyboard(internal_user_id)
-        send_vk_message(vk_user_id, response, keyboard)
+        await send_vk_message(vk_user_id, response, keyboard)
         clear_vk_state(internal_user_id)
         return
 
     if current == "vk_cancel_select":
         selected_game = get_vk_selected_game(state, normalized_text, payload)
         if not selected_game:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
             return
         response = await handle_vk_cancel_registration(internal_user_id, selected_game[0])
-        send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
         clear_vk_state(internal_user_id)
         return
 
     if current == "vk_participants_select":
         selected_game = get_vk_selected_game(state, normalized_text, payload)
         if not selected_game:
-            send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
+            await send_vk_message(vk_user_id, "Пожалуйста, выбери игру кнопкой ниже.")
             return
         game_id, game_name, game_date = selected_game
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             await format_user_participants_async(game_id, build_game_title(game_name, game_date)),
             vk_main_menu_keyboard(internal_user_id)
@@ -3547,27 +4485,28 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
         return
 
     if normalized_text == "📝Записаться на игру" or command == "register":
-        send_vk_games_list(vk_user_id, fetch_upcoming_games(), "vk_register_select", "Выбери игру для записи:", use_game_buttons=True)
+        await send_vk_games_list(vk_user_id, await fetch_upcoming_games(), "vk_register_select", "Выбери игру для записи:", use_game_buttons=True)
         return
 
     if normalized_text == "❌Отменить запись" or command == "cancel_registration":
-        games = execute_query(
+        games = await execute_query_async(
             """
             SELECT g.game_id, g.game_name, g.game_date
             FROM registrations r
             JOIN games g ON r.game_id = g.game_id
             WHERE r.user_id = %s AND g.is_deleted = FALSE AND r.status = 'registered'
+              AND (g.game_on IS NULL OR g.game_on >= %s)
+            ORDER BY g.game_on NULLS LAST, g.game_date
             """,
-            (internal_user_id,),
+            (internal_user_id, datetime.date.today()),
             fetch=True
         )
-        games = sort_games_by_date(filter_upcoming_games(games))
-        send_vk_games_list(vk_user_id, games, "vk_cancel_select", "Выбери игру, запись на которую хочешь отменить:", use_game_buttons=True)
+        await send_vk_games_list(vk_user_id, games, "vk_cancel_select", "Выбери игру, запись на которую хочешь отменить:", use_game_buttons=True)
         return
 
     if normalized_text == "✏️Обновить профиль" or command == "edit_profile":
         set_vk_state(internal_user_id, "vk_edit_profile_nick")
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             "Давай обновим профиль. Какой у тебя сейчас игровой ник в мафии?",
             vk_back_keyboard()
@@ -3575,83 +4514,83 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
         return
 
     if normalized_text == "📅Расписание игр" or command == "schedule":
-        games = fetch_upcoming_games()
+        games = await fetch_upcoming_games()
         if not games:
-            send_vk_message(vk_user_id, "Игр пока не запланировано.", vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, "Игр пока не запланировано.", vk_main_menu_keyboard(internal_user_id))
             return
         lines = ["Расписание ближайших игр:\n"]
         for _, game_name, game_date in games:
             lines.append(f"📆{game_date} {game_name}")
             lines.append(get_game_rules(game_name, game_date).strip())
             lines.append(f"\n")
-        send_vk_message(vk_user_id, "\n".join(line for line in lines if line), vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "\n".join(line for line in lines if line), vk_main_menu_keyboard(internal_user_id))
         return
 
     if normalized_text == "👥Список участников" or command == "participants":
-        send_vk_games_list(vk_user_id, fetch_upcoming_games(), "vk_participants_select", "Выбери игру, список участников которой хочешь посмотреть:", use_game_buttons=True)
+        await send_vk_games_list(vk_user_id, await fetch_upcoming_games(), "vk_participants_select", "Выбери игру, список участников которой хочешь посмотреть:", use_game_buttons=True)
         return
 
     if normalized_text == "⏰Опоздаю" or command == "mark_late":
         game_id = payload.get("game_id")
         if not isinstance(game_id, int):
-            send_vk_message(vk_user_id, "Не удалось определить игру. Попробуй отметить опоздание заново.", vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, "Не удалось определить игру. Попробуй отметить опоздание заново.", vk_main_menu_keyboard(internal_user_id))
             return
         response = await handle_vk_mark_late(internal_user_id, game_id)
-        send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
         return
 
     if command in {"thinking_reminder_yes", "thinking_reminder_no", "thinking_reminder_still"}:
         game_id = payload.get("game_id")
         if not isinstance(game_id, int):
-            send_vk_message(vk_user_id, "Не удалось определить игру. Попробуй ещё раз.", vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, "Не удалось определить игру. Попробуй ещё раз.", vk_main_menu_keyboard(internal_user_id))
             return
 
         if command == "thinking_reminder_yes":
             response = await handle_vk_registration(internal_user_id, game_id)
             keyboard = vk_late_button_keyboard(game_id) if response.startswith("Ты успешно записался на игру") else vk_main_menu_keyboard(internal_user_id)
-            send_vk_message(vk_user_id, response, keyboard)
+            await send_vk_message(vk_user_id, response, keyboard)
             return
 
         if command == "thinking_reminder_no":
             response = await handle_thinking_reminder_decline(internal_user_id, game_id)
-            send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
             return
 
-        send_vk_message(vk_user_id, "Хорошо, оставили отметку «думаю» без изменений.", vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "Хорошо, оставили отметку «думаю» без изменений.", vk_main_menu_keyboard(internal_user_id))
         return
 
     if command in {"reminder_register", "reminder_cancel", "reminder_late", "reminder_think", "reminder_decline"}:
         game_id = payload.get("game_id")
         if not isinstance(game_id, int):
-            send_vk_message(vk_user_id, "Не удалось определить игру. Попробуй ещё раз.", vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, "Не удалось определить игру. Попробуй ещё раз.", vk_main_menu_keyboard(internal_user_id))
             return
 
         if command == "reminder_register":
             response = await handle_vk_registration(internal_user_id, game_id)
             keyboard = vk_late_button_keyboard(game_id) if response.startswith("Ты успешно записался на игру") else vk_main_menu_keyboard(internal_user_id)
-            send_vk_message(vk_user_id, response, keyboard)
+            await send_vk_message(vk_user_id, response, keyboard)
             return
 
         if command == "reminder_cancel":
             response = await handle_vk_cancel_registration(internal_user_id, game_id)
-            send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
             return
 
         if command == "reminder_late":
             response = await handle_vk_mark_late(internal_user_id, game_id)
-            send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, response, vk_main_menu_keyboard(internal_user_id))
             return
 
         if command == "reminder_think":
             await mark_thinking(internal_user_id, game_id)
-            game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s", (game_id,), fetchone=True)
-            user_row = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
+            game = await get_game_info(game_id)
+            user_row = await get_user_names(internal_user_id)
             if game and user_row:
                 await notify_admin(f"🤔Игрок думает: {user_row[0]} {user_row[1]} ({user_row[2]}) на {game[1]} {game[0]}")
-            send_vk_message(vk_user_id, "Админ уведомлен, что ты думаешь😊", vk_main_menu_keyboard(internal_user_id))
+            await send_vk_message(vk_user_id, "Админ уведомлен, что ты думаешь😊", vk_main_menu_keyboard(internal_user_id))
             return
 
-        execute_query(
+        await execute_query_async(
             """
             INSERT INTO registrations (user_id, game_id, status)
             VALUES (%s, %s, 'declined')
@@ -3660,17 +4599,18 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
             """,
             (internal_user_id, game_id)
         )
-        execute_query("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (internal_user_id, game_id))
+        await execute_query_async("DELETE FROM thinking_players WHERE user_id = %s AND game_id = %s", (internal_user_id, game_id))
+        invalidate_participants_cache(game_id)
         await unmark_late(internal_user_id, game_id)
-        game = execute_query("SELECT game_name, game_date FROM games WHERE game_id = %s", (game_id,), fetchone=True)
-        user_row = execute_query("SELECT first_name, last_name, mafia_nick FROM users WHERE user_id=%s", (internal_user_id,), fetchone=True)
+        game = await get_game_info(game_id)
+        user_row = await get_user_names(internal_user_id)
         if game and user_row:
             await notify_admin(f"❌Отказ: {user_row[0]} {user_row[1]} ({user_row[2]}) на {game[1]} {game[0]}")
-        send_vk_message(vk_user_id, "Отметили, что ты не придёшь.", vk_main_menu_keyboard(internal_user_id))
+        await send_vk_message(vk_user_id, "Отметили, что ты не придёшь.", vk_main_menu_keyboard(internal_user_id))
         return
 
     if normalized_text == "📍Как до нас добраться?" or command == "location":
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             "Мы находимся по адресу:\nг. Королев, ул. Декабристов, д. 8\nВход со стороны дороги, стеклянная дверь с надписью «Тайная комната».",
             vk_main_menu_keyboard(internal_user_id)
@@ -3678,13 +4618,13 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
         return
 
     if (normalized_text == "⚙️Админ-панель" or command == "admin_panel") and vk_user_id == VK_ADMIN_ID:
-        send_vk_message(vk_user_id, "Добро пожаловать в админ-панель.", vk_admin_menu_keyboard())
+        await send_vk_message(vk_user_id, "Добро пожаловать в админ-панель.", vk_admin_menu_keyboard())
         clear_vk_state(internal_user_id)
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "➕Добавить игру" or command == "admin_add_game"):
         set_vk_state(internal_user_id, "admin_add_date")
-        send_vk_message(
+        await send_vk_message(
             vk_user_id,
             "Введи дату игры цифрами в формате ДД.ММ или ДД.ММ.ГГГГ.\nНапример: 27.03 или 27.03.2026",
             vk_back_keyboard()
@@ -3692,37 +4632,36 @@ async def handle_vk_message(vk_user_id: int, text: str, payload_raw=None):
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "❌Удалить игру" or command == "admin_delete_game"):
-        games = fetch_active_games()
-        send_vk_games_list(vk_user_id, games, "admin_delete_game", "Какую игру удалить?", use_game_buttons=True)
+        games = await fetch_active_games()
+        await send_vk_games_list(vk_user_id, games, "admin_delete_game", "Какую игру удалить?", use_game_buttons=True)
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "♻️Восстановить игру" or command == "admin_restore_game"):
-        games = fetch_active_games(include_deleted=True)
-        deleted_games = [game[:3] for game in games if len(game) > 3 and game[3]]
-        send_vk_games_list(vk_user_id, deleted_games, "admin_restore_game", "Какую игру восстановить?", use_game_buttons=True)
+        deleted_games = await fetch_deleted_games()
+        await send_vk_games_list(vk_user_id, deleted_games, "admin_restore_game", "Какую игру восстановить?", use_game_buttons=True)
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "🚫Отмена игры" or command == "admin_cancel_game"):
-        games = fetch_active_games()
-        send_vk_games_list(vk_user_id, games, "admin_cancel_game", "Какую игру отменить?", use_game_buttons=True)
+        games = await fetch_active_games()
+        await send_vk_games_list(vk_user_id, games, "admin_cancel_game", "Какую игру отменить?", use_game_buttons=True)
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "👥Список участников админ" or command == "admin_view_participants"):
-        games = fetch_active_games()
-        send_vk_games_list(vk_user_id, games, "admin_view_participants", "Для какой игры показать список участников?", use_game_buttons=True)
+        games = await fetch_active_games()
+        await send_vk_games_list(vk_user_id, games, "admin_view_participants", "Для какой игры показать список участников?", use_game_buttons=True)
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "🔔Напомнить об игре" or command == "admin_reminder"):
-        games = fetch_upcoming_games()
-        send_vk_games_list(vk_user_id, games, "admin_reminder_game", "Для какой игры отправить напоминание?", use_game_buttons=True)
+        games = await fetch_upcoming_games()
+        await send_vk_games_list(vk_user_id, games, "admin_reminder_game", "Для какой игры отправить напоминание?", use_game_buttons=True)
         return
 
     if vk_user_id == VK_ADMIN_ID and (normalized_text == "📢Рассылка" or command == "admin_broadcast"):
         set_vk_state(internal_user_id, "admin_broadcast_audience")
-        send_vk_message(vk_user_id, "Кому отправить сообщение?", vk_audience_keyboard())
+        await send_vk_message(vk_user_id, "Кому отправить сообщение?", vk_audience_keyboard())
         return
 
-    send_vk_message(vk_user_id, "Не понял команду. Пожалуйста, используй кнопки меню.", vk_main_menu_keyboard(internal_user_id))
+    await send_vk_message(vk_user_id, "Не понял команду. Пожалуйста, используй кнопки меню.", vk_main_menu_keyboard(internal_user_id))
 
 
 def vk_polling_loop(loop: asyncio.AbstractEventLoop):
@@ -3744,11 +4683,10 @@ def vk_polling_loop(loop: asyncio.AbstractEventLoop):
         mask_secret(VK_TOKEN),
     )
 
-    global vk_session, vk_api_client, vk_longpoll
+    global vk_session, vk_longpoll
     while True:
         try:
             vk_session = vk_api.VkApi(token=VK_TOKEN)
-            vk_api_client = vk_session.get_api()
             vk_longpoll = VkBotLongPoll(vk_session, int(VK_GROUP_ID))
         except vk_api.exceptions.ApiError as exc:
             logging.error(
@@ -3784,7 +4722,7 @@ def vk_polling_loop(loop: asyncio.AbstractEventLoop):
                         continue
 
                     future = asyncio.run_coroutine_threadsafe(
-                        handle_vk_message(int(vk_user_id), "Начать", {"command": "start"}),
+                        process_vk_message(int(vk_user_id), "Начать", {"command": "start"}),
                         loop,
                     )
                     try:
@@ -3813,7 +4751,15 @@ def vk_polling_loop(loop: asyncio.AbstractEventLoop):
 
                 text = message.get("text", "")
                 payload = message.get("payload")
-                future = asyncio.run_coroutine_threadsafe(handle_vk_message(message["from_id"], text, payload), loop)
+                future = asyncio.run_coroutine_threadsafe(
+                    process_vk_message(
+                        message["from_id"],
+                        text,
+                        payload,
+                        message.get("conversation_message_id") or message.get("id"),
+                    ),
+                    loop,
+                )
                 try:
                     future.result()
                 except Exception as exc:
@@ -3828,7 +4774,17 @@ def vk_polling_loop(loop: asyncio.AbstractEventLoop):
 
 async def main():
     vk_thread = None
+    outbox_task = None
+    admin_notification_task = None
     try:
+        outbox_task = asyncio.create_task(outbox_worker())
+        admin_notification_task = asyncio.create_task(admin_notification_worker())
+        if WAKE_UP_ON_START:
+            try:
+                await wake_up_all_users()
+            except Exception as e:
+                logging.exception(f"Не удалось запустить wake-up рассылку: {e}")
+
         if DISABLE_TELEGRAM_POLLING:
             logging.warning(
                 "Telegram polling отключен через DISABLE_TELEGRAM_POLLING. "
@@ -3849,6 +4805,13 @@ async def main():
             # Оставляем pending updates, чтобы пользователям не приходилось заново нажимать кнопки после деплоя
             await dp.start_polling(bot, skip_updates=False)
     finally:
+        if outbox_task:
+            outbox_task.cancel()
+        if admin_notification_task:
+            admin_notification_task.cancel()
+            await asyncio.wait([admin_notification_task], timeout=5)
+        if vk_async_api:
+            await vk_async_api.close()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# main.py при импорте создает Bot и требует токен; запросы к Telegram при этом не уходят
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:plan-test")
+try:
+    import main
+except ImportError as exc:
+    main = None
+    MAIN_IMPORT_ERROR = str(exc)
+else:
+    MAIN_IMPORT_ERROR = ""
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@unittest.skipUnless(os.environ.get("DATABASE_URL"), "DATABASE_URL не задан")
+@unittest.skipIf(main is None, f"main.py не импортируется: {MAIN_IMPORT_ERROR}")
+class QueryPlanTest(unittest.TestCase):
+    """Проверяет по EXPLAIN, что запросы аудиторий используют индексы по game_id."""
+
+    @classmethod
+    def setUpClass(cls):
+        database.init_db()
+
+    def setUp(self):
+        # Данные и статистика живут только в транзакции теста и откатываются в tearDown
+        self.conn = database.get_connection()
+        self.cursor = self.conn.cursor()
+        self.cursor.execute("""
+            INSERT INTO users (user_id, first_name, platform, platform_user_id)
+            SELECT -1000000 - n, 'test', 'plan_test', n FROM generate_series(1, 20000) n
+        """)
+        self.cursor.execute("""
+            INSERT INTO games (game_id, game_name, game_date)
+            SELECT -n, 'plan test ' || n, '01.01' FROM generate_series(1, 200) n
+        """)
+        self.cursor.execute("""
+            INSERT INTO registrations (user_id, game_id, status)
+            SELECT -1000000 - (g * 97 + n) % 20000 - 1, -g, CASE WHEN n % 5 = 0 THEN 'declined' ELSE 'registered' END
+            FROM generate_series(1, 200) g, generate_series(1, 40) n
+        """)
+        self.cursor.execute("""
+            INSERT INTO thinking_players (user_id, game_id)
+            SELECT -1000000 - (g * 89 + n) % 20000 - 1, -g
+            FROM generate_series(1, 200) g, generate_series(1, 10) n
+            ON CONFLICT DO NOTHING
+        """)
+        self.cursor.execute("ANALYZE users, registrations, thinking_players")
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.cursor.close()
+        self.conn.close()
+
+    def explain(self, query):
+        self.cursor.execute("EXPLAIN (FORMAT JSON) " + query, (-7,))
+        plan = self.cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return list(plan_nodes(plan[0]["Plan"]))
+
+    def assertUsesIndex(self, query, index_name):
+        nodes = self.explain(query)
+        self.assertIn(index_name, [node.get("Index Name") for node in nodes])
+
+    def test_registered_audience_uses_game_status_index(self):
+        self.assertUsesIndex(main.REGISTERED_AUDIENCE_QUERY, "registrations_game_status_idx")
+        self.assertUsesIndex(main.REMINDER_REGISTERED_AUDIENCE_QUERY, "registrations_game_status_idx")
+
+    def test_not_registered_audience_uses_game_status_index(self):
+        self.assertUsesIndex(main.NOT_REGISTERED_AUDIENCE_QUERY, "registrations_game_status_idx")
+        self.assertUsesIndex(main.REMINDER_NOT_REGISTERED_AUDIENCE_QUERY, "registrations_game_status_idx")
+
+    def test_thinking_audience_uses_game_user_index(self):
+        self.assertUsesIndex(main.THINKING_AUDIENCE_QUERY, "thinking_players_game_user_idx")
+
+if __name__ == "__main__":
+    unittest.main()